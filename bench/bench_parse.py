@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""对比不同解析器和 SoupStrainer 对机器列表页与 writeup 页的解析耗时
+
+    python3 bench/bench_parse.py
+    python3 bench/bench_parse.py --machines saved_machines.html --writeups saved_writeupz.html
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hmvcli  # noqa: E402
+from fixtures import machine_names, machines_page, writeups_page  # noqa: E402
+
+
+def parse_machines_page(html):
+    soup = hmvcli.make_soup(html, hmvcli.MACHINES_STRAINER)
+    return hmvcli.parse_machines(soup), hmvcli.parse_total_pages(soup)
+
+
+def configurations():
+    yield 'html.parser', False
+    yield 'html.parser', True
+    try:
+        import lxml  # noqa: F401
+    except ImportError:
+        return
+    yield 'lxml', False
+    yield 'lxml', True
+
+
+def bench(label, func, html, repeat):
+    results = []
+    for parser, strained in configurations():
+        hmvcli.HTML_PARSER = parser
+        hmvcli.MACHINES_STRAINER = MACHINES_STRAINER if strained else None
+        hmvcli.WRITEUPS_STRAINER_PARSERS = (parser,) if strained else ()
+        func(html)  # 预热
+        seconds = min(timeit.repeat(lambda: func(html), number=1, repeat=repeat))
+        results.append((parser, strained, seconds))
+    baseline = results[0][2]
+    print(f"\n{label} ({len(html) / 1024:,.0f} KiB)")
+    print(f"  {'parser':<12} {'strainer':<9} {'ms':>9} {'speedup':>8}")
+    for parser, strained, seconds in results:
+        print(f"  {parser:<12} {'yes' if strained else 'no':<9} {seconds * 1000:9.1f} {baseline / seconds:7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML parsing of HackMyVM pages")
+    parser.add_argument("--machines", help="Saved /machines/ page (default: synthetic fixture)")
+    parser.add_argument("--writeups", help="Saved writeupz.php page (default: synthetic fixture)")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Timing repetitions (best is reported)")
+    args = parser.parse_args()
+
+    names = machine_names(400)
+    machines_html = open(args.machines, encoding='utf-8').read() if args.machines \
+        else machines_page(names[:30], page=1, total_pages=14)
+    writeups_html = open(args.writeups, encoding='utf-8').read() if args.writeups \
+        else writeups_page(names)
+
+    bench("machines page", parse_machines_page, machines_html, args.repeat)
+    bench("writeups page", hmvcli.extract_writeups_from_html, writeups_html, args.repeat)
+
+
+MACHINES_STRAINER = hmvcli.MACHINES_STRAINER
+
+if __name__ == "__main__":
+    main()
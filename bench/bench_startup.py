@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+"""测量 hmvcli.py 各命令的启动耗时和导入耗时（基于 python -X importtime）
+
+    python3 bench/bench_startup.py
+    python3 bench/bench_startup.py -n 20
+
+只读本地缓存的命令在临时 HOME 中运行，缓存由合成数据生成，不访问网络。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+CLI = os.path.join(ROOT, "hmvcli.py")
+
+COMMANDS = [
+    ["--help"],
+    ["search", "--help"],
+    ["search", "-n", "to"],
+    ["writeup", "to"],
+]
+
+
+def build_caches(home):
+    """在临时 HOME 中写入合成的机器目录和 writeup 库"""
+    sys.path[:0] = [ROOT, BENCH_DIR]
+    import hmvcli
+    from fixtures import machine_names, machines_page, writeups_page
+
+    names = machine_names(400)
+    machines = hmvcli.parse_machines(hmvcli.make_soup(machines_page(names), hmvcli.MACHINES_STRAINER))
+    with open(os.path.join(home, ".hmv_machines.json"), "w", encoding="utf-8") as f:
+        json.dump({"timestamp": "", "machines": machines}, f)
+
+    hmvcli.WRITEUP_FILE = os.path.join(home, ".hmv_writeups.db")
+    conn = hmvcli.open_writeup_db()
+    hmvcli.init_writeup_db(conn)
+    with conn:
+        hmvcli.merge_writeups(conn, hmvcli.extract_writeups_from_html(writeups_page(names)))
+    conn.close()
+
+
+def import_time_us(args, env):
+    """-X importtime 输出中顶层模块的累计导入耗时（微秒），不含解释器自身的 site"""
+    result = subprocess.run([sys.executable, "-X", "importtime", CLI] + args, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  ") and name.strip() != "site":  # 只统计顶层导入，子模块已计入其中
+            total += int(cumulative)
+    return total
+
+
+def wall_time_ms(argv, env, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hmvcli.py startup time")
+    parser.add_argument("-n", "--runs", type=int, default=10, help="Runs per command (median is reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        build_caches(home)
+        env = dict(os.environ, HOME=home)
+        baseline = wall_time_ms(["-c", "pass"], env, args.runs)
+
+        print(f"interpreter only: {baseline:.1f} ms\n")
+        print(f"  {'command':<22} {'wall ms':>9} {'imports ms':>11}")
+        for command in COMMANDS:
+            wall = wall_time_ms([CLI] + command, env, args.runs)
+            imports = import_time_us(command, env) / 1000
+            print(f"  {' '.join(command):<22} {wall:9.1f} {imports:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
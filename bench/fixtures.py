@@ -0,0 +1,97 @@
+"""生成与 hackmyvm.eu 页面结构一致的合成 HTML 夹具，供基准测试使用"""
+
+import random
+
+LEVEL_COLORS = ['#28a745', '#ffc107', '#dc3545']
+LANGUAGES = ['English', 'Spanish', 'Chinese', 'French', 'German']
+
+# 模拟真实页面中与数据无关的部分（导航栏、侧边栏、脚本），让解析量接近线上页面
+CHROME_HEAD = """<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>HackMyVM</title>
+<link rel="stylesheet" href="/css/bootstrap.min.css">{scripts}</head><body>
+<nav class="navbar navbar-expand-lg navbar-dark bg-dark"><ul class="navbar-nav">{nav}
+<li class="nav-item"><a class="nav-link" href="/login/logout.php">Logout</a></li></ul></nav>
+"""
+CHROME_FOOT = """<footer class="footer">{links}</footer></body></html>"""
+
+
+def _chrome_head(rng):
+    scripts = "".join(f'<script>var cfg{i} = {{"k": "{rng.random()}"}};</script>' for i in range(40))
+    nav = "".join(f'<li class="nav-item"><a class="nav-link" href="/p{i}/">Menu {i}</a></li>' for i in range(12))
+    return CHROME_HEAD.format(scripts=scripts, nav=nav)
+
+
+def _chrome_foot():
+    return CHROME_FOOT.format(links="".join(f'<a href="/f{i}">Link {i}</a> ' for i in range(60)))
+
+
+def machine_names(count, seed=0):
+    rng = random.Random(seed)
+    syllables = ['to', 'dd', 'gi', 'ft', 'ha', 'ck', 'in', 'os', 'ze', 'ro', 'lu', 'na', 'qu', 'ix']
+    names = []
+    while len(names) < count:
+        name = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize()
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def machines_page(names, page=1, total_pages=1, seed=0):
+    """/machines/ 列表页"""
+    rng = random.Random(seed + page)
+    rows = []
+    for name in names:
+        status = rng.choice(['TO HACK', 'HACKED'])
+        rows.append(
+            f'<tr><td><div class="card" style="border-top: 4px solid {rng.choice(LEVEL_COLORS)};">'
+            f'<img src="/img/{name.lower()}.png" alt="{name}"><h4 class="vmname">{name}</h4></div></td>'
+            f'<td><a href="/profile/?user=creator{rng.randint(1, 40)}">creator{rng.randint(1, 40)}</a></td>'
+            f'<td><span class="badge bg-secondary">{status}</span>'
+            f'<a href="machine.php?vm={name}" class="btn btn-sm">Info</a></td></tr>')
+    pager = "".join(f'<li class="page-item"><a class="page-link" href="?p={i}">{label}</a></li>'
+                    for i, label in enumerate(['First', 'Prev', str(max(page - 1, 1)), str(page),
+                                               f'{page}/{total_pages}', 'Next', 'Last'], 1))
+    return (_chrome_head(rng)
+            + '<div class="container-xxl"><div class="row"><div class="col-2"><aside>'
+            + "".join(f'<a href="?t=tag{i}">tag{i}</a>' for i in range(30))
+            + '</aside></div><div class="col-10"><div><div>'
+            + '<table class="mt-1 table table-striped table-dark"><thead><tr><th>VM</th><th>Creator</th>'
+            + '<th>Status</th></tr></thead><tbody>' + "".join(rows) + '</tbody></table>'
+            + f'<div class="container"><nav><ul class="pagination">{pager}</ul></nav></div>'
+            + '</div></div></div></div></div>' + _chrome_foot())
+
+
+def machine_page(name, seed=0):
+    """/machines/machine.php?vm= 详情页"""
+    rng = random.Random(f"{seed}:{name}")
+    tags = rng.sample(['suid', 'sudo', 'web', 'cron', 'docker', 'smb', 'sqli', 'lfi', 'rce', 'stego'], rng.randint(1, 4))
+    size = f"{rng.uniform(0.3, 6):.1f} GB" if rng.random() < 0.8 else f"{rng.randint(200, 990)} MB"
+    return (_chrome_head(rng)
+            + '<div class="container-xxl"><div class="row"><div class="col-2"><aside>'
+            + "".join(f'<a href="/machines/?t=tag{i}">tag{i}</a>' for i in range(30))
+            + '</aside></div><div class="col-10"><div class="card">'
+            + f'<h1 class="vmname">{name}</h1>'
+            + f'<p><b>Creator:</b> <a href="/profile/?user=creator{rng.randint(1, 40)}">creator{rng.randint(1, 40)}</a></p>'
+            + f'<p><b>Level:</b> {rng.choice(["Easy", "Medium", "Hard"])}</p>'
+            + f'<p><b>OS:</b> {rng.choice(["Linux", "Linux", "Linux", "Windows"])}</p>'
+            + f'<p><b>Size:</b> {size}</p>'
+            + f'<p><b>Release:</b> 20{rng.randint(20, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}</p>'
+            + '<p>Tags: ' + " ".join(f'<a class="badge" href="/machines/?t={tag}">{tag}</a>' for tag in tags) + '</p>'
+            + f'<a class="btn" href="https://downloads.hackmyvm.eu/{name.lower()}.zip">Download</a>'
+            + '</div></div></div></div>' + _chrome_foot())
+
+
+def writeups_page(names, per_machine=5, seed=0):
+    """/hmv/writeupz.php 页面"""
+    rng = random.Random(seed)
+    rows = ['<tr><th>Machine</th><th>Author</th><th>Language</th><th>Writeup</th></tr>']
+    for name in names:
+        for _ in range(rng.randint(1, per_machine * 2 - 1)):
+            author = f"author{rng.randint(1, 500)}"
+            rows.append(
+                f'<tr><td><a href="/machines/machine.php?vm={name}">{name}</a></td>'
+                f'<td><img src="/img/avatars/{author}.png"><img src="/img/flags/es.png">'
+                f'<a href="/profile/?user={author}">{author}</a></td>'
+                f'<td>{rng.choice(LANGUAGES)}</td>'
+                f'<td><a href="https://blog.example.com/{author}/{name.lower()}">Read</a></td></tr>')
+    return (_chrome_head(rng) + '<div class="container"><table class="table table-dark">'
+            + "".join(rows) + '</table></div>' + _chrome_foot())
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+"""离线端到端基准：启动本地替身服务器（bench/server.py），在临时 HOME 中测量各命令路径的耗时
+
+    python3 bench/run_bench.py
+    python3 bench/run_bench.py --latency 80 --bandwidth 10M --sizes 16m,64m --json results.json
+
+测量项：目录全量抓取、writeup 冷/热刷新、writeup 查询、机器详情抓取与重新校验、单个/批量 flag 提交、
+不同文件大小下单连接与分段下载的吞吐。全程不访问 hackmyvm.eu。
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+SERVER = os.path.join(BENCH_DIR, "server.py")
+
+
+def start_server(args):
+    """以子进程启动服务器（避免与被测代码争用 GIL），返回 (进程, base_url)"""
+    argv = [sys.executable, SERVER, "--port", "0", "--latency", str(args.latency), "--machines", str(args.machines)]
+    if args.bandwidth:
+        argv += ["--bandwidth", args.bandwidth]
+    proc = subprocess.Popen(argv, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith("listening on "):
+        proc.kill()
+        sys.exit(f"server failed to start: {line!r}")
+    return proc, line.split()[2]
+
+
+def measure(func, runs, setup=None):
+    """运行 runs 次，返回耗时中位数（秒）；hmvcli 的输出被丢弃"""
+    samples = []
+    for _ in range(runs):
+        if setup:
+            setup()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def remove(*paths):
+    for path in paths:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def run(args, base_url, home):
+    # hmvcli 在导入时读取 HOME 和 HMV_* 环境变量来确定缓存路径与站点地址
+    os.environ.update(HOME=home, HMV_BASE_URL=base_url, HMV_DOWNLOAD_URL=f"{base_url}/downloads")
+    sys.path[:0] = [ROOT, BENCH_DIR]
+    import hmvcli
+    from fixtures import machine_names
+    from server import parse_size
+
+    with open(hmvcli.CONFIG_FILE, "w") as f:
+        json.dump({"username": "bench", "password": "bench"}, f)
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        hmvcli.get_authenticated_session()  # 预先登录，后续各项都复用保存的 session
+
+    names = machine_names(args.machines)
+    batch_file = os.path.join(home, "flags.csv")
+    with open(batch_file, "w") as f:
+        f.writelines(f"{name},HMV{{{name if i % 2 else 'nope'}}}\n" for i, name in enumerate(names[:args.flags]))
+
+    results = []
+
+    def add(name, seconds, count=None, unit=None):
+        entry = {"name": name, "ms": round(seconds * 1000, 2)}
+        if count:
+            entry[unit] = round(count / seconds, 1)
+        results.append(entry)
+        extra = f"  {entry[unit]:>10.1f} {unit}" if count else ""
+        print(f"{name:<32} {entry['ms']:>10.1f} ms{extra}", file=sys.stderr)
+
+    add("catalog crawl", measure(hmvcli.fetch_and_update_catalog, args.runs), args.machines, "machines/s")
+    add("writeup refresh (cold)", measure(hmvcli.fetch_and_update_writeups, args.runs,
+                                          setup=lambda: remove(hmvcli.WRITEUP_FILE)))
+    add("writeup refresh (304)", measure(hmvcli.fetch_and_update_writeups, args.runs))
+    add("writeup lookup", measure(lambda: hmvcli.search_writeups(names[0]), args.runs))
+    add("detail crawl (cold)", measure(lambda: hmvcli.update_details(names), args.runs,
+                                       setup=lambda: remove(hmvcli.DETAILS_FILE)), args.machines, "machines/s")
+    add("detail revalidate (304)", measure(lambda: hmvcli.update_details(names, refresh=True), args.runs),
+        args.machines, "machines/s")
+    add("flag submit", measure(lambda: hmvcli.submit_flag(f"HMV{{{names[0]}}}", names[0]), args.runs))
+    add(f"flag batch ({args.flags})", measure(lambda: hmvcli.submit_flag_batch(batch_file), args.runs),
+        args.flags, "flags/s")
+
+    os.chdir(home)
+    for size in args.sizes:
+        name = f"bench{size}"
+        nbytes = parse_size(size)
+        for segments in (1, args.segments):
+            seconds = measure(lambda: hmvcli.download_machine(name, segments=segments, show=False), args.runs,
+                              setup=lambda: remove(f"{name}.zip"))
+            add(f"download {size} x{segments}", seconds, nbytes / 1024 / 1024, "MiB/s")
+    remove(*(f"bench{size}.zip" for size in args.sizes))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark against a local stand-in server")
+    parser.add_argument("-n", "--runs", type=int, default=3, help="Runs per measurement (median is reported)")
+    parser.add_argument("--latency", type=float, default=20, help="Server latency per response in ms")
+    parser.add_argument("--bandwidth", help="Per-connection bandwidth cap, e.g. 20M (bytes/s)")
+    parser.add_argument("--machines", type=int, default=400, help="Number of synthetic machines")
+    parser.add_argument("--flags", type=int, default=40, help="Flags per batch submission")
+    parser.add_argument("--sizes", type=lambda s: s.split(","), default=["4m", "32m"],
+                        help="Comma-separated download sizes (default: 4m,32m)")
+    parser.add_argument("-s", "--segments", type=int, default=4, help="Segments to compare against a single stream")
+    parser.add_argument("--json", metavar="FILE", help="Also write results as JSON")
+    args = parser.parse_args()
+
+    proc, base_url = start_server(args)
+    try:
+        with tempfile.TemporaryDirectory() as home:
+            results = run(args, base_url, home)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency_ms": args.latency, "bandwidth": args.bandwidth, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
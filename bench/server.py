@@ -0,0 +1,218 @@
+#!/usr/bin/python3
+"""本地 HackMyVM 替身服务器：用合成夹具页面模拟 /machines/、machine.php、writeupz.php、checkflag.php、
+login/auth.php 和 zip 下载，支持 Range、ETag 以及可配置的延迟和带宽
+
+    python3 bench/server.py --port 8000 --latency 50 --bandwidth 20M
+    HMV_BASE_URL=http://127.0.0.1:8000 HMV_DOWNLOAD_URL=http://127.0.0.1:8000/downloads \\
+        python3 hmvcli.py search -a
+
+下载文件名形如 bench<大小>.zip（如 bench64m.zip、bench512k.zip），内容为单个未压缩的 .ova 成员。
+正确的 flag 为 HMV{<机器名>}。未登录（或 session 已被 POST /bench/expire 注销）时，
+站内页面和 checkflag.php 会被重定向到登录页。
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import machine_names, machine_page, machines_page, writeups_page  # noqa: E402
+
+LOGIN_PAGE = (b'<!DOCTYPE html><html><body><form action="/login/auth.php" method="post">'
+              b'<input name="admin"><input name="password_usuario" type="password"></form></body></html>')
+PROTECTED_PATHS = {"/machines/", "/machines/machine.php", "/hmv/writeupz.php", "/machines/checkflag.php"}
+SIZE_UNITS = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_size(value):
+    value = value.strip().lower().rstrip('b')
+    if value and value[-1] in SIZE_UNITS:
+        return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+    return int(value)
+
+
+class Site:
+    """预先生成的页面和按需生成（并缓存）的 zip 文件"""
+    def __init__(self, machines=400, per_page=30):
+        self.names = machine_names(machines)
+        self.per_page = per_page
+        self.total_pages = -(-len(self.names) // per_page)
+        self.pages = {}
+        self.writeups = writeups_page(self.names).encode()
+        self.writeups_etag = '"%s"' % hashlib.sha256(self.writeups).hexdigest()[:16]
+        self.details = {}
+        self.zips = {}
+        self.sessions = set()
+        self.lock = threading.Lock()
+
+    def machines(self, query):
+        names = self.names
+        if query.get('v'):
+            names = [name for name in names if query['v'][0].lower() in name.lower()]
+        if query.get('l'):
+            return machines_page(names, 1, 1).encode()  # 与线上一致：按等级筛选时不分页
+        total_pages = max(-(-len(names) // self.per_page), 1)
+        page = min(max(int(query.get('p', ['1'])[0]), 1), total_pages)
+        key = (query.get('v', [''])[0], page)
+        if key not in self.pages:
+            chunk = names[(page - 1) * self.per_page:page * self.per_page]
+            self.pages[key] = machines_page(chunk, page, total_pages).encode()
+        return self.pages[key]
+
+    def machine(self, name):
+        """返回 (页面, ETag)，未知机器返回 (None, None)"""
+        match = next((n for n in self.names if n.lower() == name.lower()), None)
+        if match is None:
+            return None, None
+        if match not in self.details:
+            page = machine_page(match).encode()
+            self.details[match] = page, '"%s"' % hashlib.sha256(page).hexdigest()[:16]
+        return self.details[match]
+
+    def zip_file(self, size):
+        with self.lock:
+            if size not in self.zips:
+                block = os.urandom(1024 * 1024)
+                payload = (block * (size // len(block) + 1))[:size]
+                buffer = io.BytesIO()
+                with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+                    archive.writestr('bench/bench.ova', payload)
+                self.zips[size] = buffer.getvalue()
+            return self.zips[size]
+
+
+def make_handler(site, latency, bandwidth, ignore_range=False):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_body(self, body, status=200, headers=None, head=False):
+            if latency:
+                time.sleep(latency)
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if head:
+                return
+            view = memoryview(body)
+            chunk = 64 * 1024
+            start = time.monotonic()
+            for offset in range(0, len(body), chunk):
+                self.wfile.write(view[offset:offset + chunk])
+                if bandwidth:
+                    # 每个连接各自限速，模拟单条 TCP 连接的带宽上限
+                    ahead = (offset + chunk) / bandwidth - (time.monotonic() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+        def logged_in(self):
+            cookies = dict(part.strip().split("=", 1) for part in self.headers.get("Cookie", "").split(";")
+                           if "=" in part)
+            return cookies.get("PHPSESSID") in site.sessions
+
+        def redirect_to_login(self, head=False):
+            self.send_body(b"", 302, {"Location": "/login/"}, head=head)
+
+        def do_HEAD(self):
+            self.do_GET(head=True)
+
+        def do_GET(self, head=False):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            html = {"Content-Type": "text/html; charset=utf-8"}
+            if url.path in PROTECTED_PATHS and not self.logged_in():
+                return self.redirect_to_login(head)
+            if url.path == "/login/":
+                return self.send_body(LOGIN_PAGE, headers=html, head=head)
+            if url.path == "/machines/":
+                return self.send_body(site.machines(query), headers=html, head=head)
+            if url.path == "/machines/machine.php":
+                page, etag = site.machine(query.get('vm', [''])[0])
+                if page is None:
+                    return self.send_body(b"not found", 404, head=head)
+                if self.headers.get("If-None-Match") == etag:
+                    return self.send_body(b"", 304, {"ETag": etag}, head=True)
+                return self.send_body(page, headers={**html, "ETag": etag}, head=head)
+            if url.path == "/hmv/writeupz.php":
+                if self.headers.get("If-None-Match") == site.writeups_etag:
+                    return self.send_body(b"", 304, {"ETag": site.writeups_etag}, head=True)
+                return self.send_body(site.writeups, headers={**html, "ETag": site.writeups_etag}, head=head)
+            match = re.fullmatch(r"/downloads/bench(\d+[kmg]?)\.zip", url.path)
+            if match:
+                return self.send_zip(site.zip_file(parse_size(match.group(1))), head)
+            self.send_body(b"not found", 404, head=head)
+
+        def send_zip(self, data, head):
+            headers = {"Accept-Ranges": "bytes", "Content-Type": "application/zip"}
+            match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if not match or ignore_range:  # ignore_range：模拟声明支持 Range 却总是返回整个文件的服务器
+                return self.send_body(data, headers=headers, head=head)
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(data) - 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            self.send_body(data[start:end + 1], 206, headers, head)
+
+        def do_POST(self):
+            form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode())
+            path = urlparse(self.path).path
+            if path == "/login/auth.php":
+                token = secrets.token_hex(8)
+                site.sessions.add(token)
+                page = machines_page(site.names[:1])
+                return self.send_body(page.encode(), headers={"Set-Cookie": f"PHPSESSID={token}; Path=/"})
+            if path == "/bench/expire":
+                site.sessions.clear()
+                return self.send_body(b"expired")
+            if path in PROTECTED_PATHS and not self.logged_in():
+                return self.redirect_to_login()
+            if path == "/machines/checkflag.php":
+                vm, flag = form.get("vm", [""])[0], form.get("flag", [""])[0]
+                correct = flag == "HMV{%s}" % vm
+                return self.send_body(b"Correct flag!" if correct else b"Wrong flag.")
+            self.send_body(b"not found", 404)
+
+    return Handler
+
+
+def start_server(port=0, latency_ms=0, bandwidth=None, machines=400, ignore_range=False):
+    """在后台线程启动服务器，返回 (server, base_url)"""
+    site = Site(machines)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(site, latency_ms / 1000, bandwidth, ignore_range))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in HackMyVM server for benchmarks")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0, help="Added latency per response in ms")
+    parser.add_argument("--bandwidth", type=parse_size, help="Per-connection bandwidth cap, e.g. 20M (bytes/s)")
+    parser.add_argument("--machines", type=int, default=400, help="Number of synthetic machines")
+    parser.add_argument("--ignore-range", action="store_true",
+                        help="Advertise Accept-Ranges but answer range requests with the whole file")
+    args = parser.parse_args()
+    server, base_url = start_server(args.port, args.latency, args.bandwidth, args.machines, args.ignore_range)
+    print(f"listening on {base_url} (downloads at {base_url}/downloads)", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
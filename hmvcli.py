@@ -1,22 +1,59 @@
 #!/usr/bin/python3
 
 import argparse
+import contextlib
+import functools
+import itertools
 import json
 import os
-import pickle
-import requests
-from bs4 import BeautifulSoup
-from prettytable import PrettyTable
+import re
 import sys
+import threading
+import time
 from datetime import datetime, timedelta
-import csv
+from bisect import bisect_left
 from urllib.parse import urljoin
 
+# requests、bs4、prettytable 等较重的依赖在用到它们的函数内导入，
+# 让 --help、config 和只读本地缓存的命令不必为此付出启动时间
+
 # ===================== 基础配置 =====================
 CONFIG_FILE = os.path.expanduser("~/.hmv_config.json")
-SESSION_FILE = os.path.expanduser("~/.hmv_session.pkl")
-WRITEUP_FILE = os.path.expanduser("~/.hmv_writeups.csv")
+SESSION_FILE = os.path.expanduser("~/.hmv_session.json")
+LEGACY_SESSION_FILE = os.path.expanduser("~/.hmv_session.pkl")  # 旧版本 pickle 格式，保存新 session 时删除
+SESSION_VERIFY_INTERVAL = timedelta(minutes=30)  # 超过该时间未确认的 session 需要重新校验
+WRITEUP_FILE = os.path.expanduser("~/.hmv_writeups.db")
 WRITEUP_CACHE_TIMEOUT = timedelta(hours=24)  # writeup 缓存24小时
+WRITEUP_FIELDS = ['vmname', 'machine_url', 'author', 'author_url', 'avatar_url', 'country_flag', 'language', 'writeup']
+CATALOG_FILE = os.path.expanduser("~/.hmv_machines.json")
+CATALOG_CACHE_TIMEOUT = timedelta(hours=24)  # 机器目录缓存24小时
+DETAILS_FILE = os.path.expanduser("~/.hmv_details.json")
+DETAIL_CACHE_TIMEOUT = timedelta(days=7)  # 机器详情很少变化，超过7天再向服务器重新校验
+DETAIL_FIELDS = ['name', 'level', 'os', 'size', 'release', 'creator', 'tags', 'download', 'link']
+# 站点地址可用环境变量覆盖，便于对接本地的测试/基准服务器（见 bench/server.py）
+BASE_URL = os.environ.get("HMV_BASE_URL", "https://hackmyvm.eu").rstrip('/')
+DOWNLOAD_BASE_URL = os.environ.get("HMV_DOWNLOAD_URL", "https://downloads.hackmyvm.eu").rstrip('/')
+MACHINES_URL = f"{BASE_URL}/machines/"
+MACHINE_DETAIL_URL = f"{MACHINES_URL}machine.php"
+MAX_WORKERS = 8  # 并发请求数，不超过 requests 默认连接池大小
+DOWNLOAD_SEGMENTS = 4  # 并行下载的区间数
+DOWNLOAD_JOBS = 2  # 批量下载时同时下载的文件数
+POOL_SIZE = max(MAX_WORKERS, DOWNLOAD_JOBS * DOWNLOAD_SEGMENTS)  # 每个主机的连接池大小
+HTTP_TIMEOUT = (float(os.environ.get("HMV_CONNECT_TIMEOUT", 5)),  # (连接超时, 读取超时)，可用环境变量覆盖
+                float(os.environ.get("HMV_READ_TIMEOUT", 30)))
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5  # 重试间隔 0.5s、1s、2s
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+FLAG_URL = f"{BASE_URL}/machines/checkflag.php"
+LOGIN_URL = f"{BASE_URL}/login/auth.php"
+WRITEUPS_URL = f"{BASE_URL}/hmv/writeupz.php"
+FLAG_JOBS = 4  # 批量提交 flag 的并发数
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_STATE_INTERVAL = 16 * 1024 * 1024  # 每写入 16 MiB 保存一次续传状态
+MANIFEST_FILE = os.path.expanduser("~/.hmv_manifest.json")
+EXTRACT_BUFFER_SIZE = 1024 * 1024
+VM_IMAGE_SUFFIXES = ('.ova', '.ovf', '.vmdk', '.vdi', '.qcow2', '.vhd', '.vhdx', '.mf')
 
 class bcolors:
     OKGREEN = '\033[92m'
@@ -24,7 +61,11 @@ class bcolors:
     FAIL = '\033[91m'
     ENDC = '\033[0m'
 
+MACHINE_FIELDS = ['name', 'level', 'status', 'creator', 'link']
+OUTPUT_FORMATS = ['table', 'jsonl', 'csv']
+LEVEL_COLOR_MAP = {'#28a745': 'easy', '#ffc107': 'medium', '#dc3545': 'hard'}
 LEVEL_CHOICES = ['easy', 'medium', 'hard', 'windows', 'linux', 'size', 'hacked', 'all']
+CATALOG_LEVELS = ['easy', 'medium', 'hard', 'all']  # 本地目录可直接回答的等级
 TAG_CHOICES = [
     'bruteforce', 'suid', 'wordpress', 'cron', 'smb', 'docker', 'sudo', 'web',
     'fileupload', 'pathhijacking', 'stego', 'binary', 'capabilities', 'cve',
@@ -46,7 +87,7 @@ def load_config():
 def save_config(username, password):
     config = {"username": username, "password": password}
     try:
-        with open(CONFIG_FILE, 'w') as f:
+        with file_lock(CONFIG_FILE), atomic_write(CONFIG_FILE) as f:  # 含明文密码，mkstemp 创建的文件权限为 0600
             json.dump(config, f, indent=4)
         print("[+] Configuration saved successfully.")
     except Exception as e:
@@ -62,33 +103,263 @@ def configure_credentials():
         sys.exit(1)
     save_config(username, password)
 
+# ===================== 性能计时 =====================
+TIMINGS = None  # 开启 --timings 后为 {阶段: [耗时秒数, 次数, 字节数, [(开始, 结束), ...]]}
+TIMINGS_LOCK = threading.Lock()
+TIMING_STACK = threading.local()
+TIMING_STAGES = ['session', 'cache', 'http', 'parse', 'render']
+
+def record_timing(stage, start, end, nbytes=0):
+    if TIMINGS is None:
+        return
+    with TIMINGS_LOCK:
+        entry = TIMINGS.setdefault(stage, [0.0, 0, 0, []])
+        entry[0] += end - start
+        entry[1] += 1
+        entry[2] += nbytes
+        entry[3].append((start, end))
+
+def wall_seconds(intervals):
+    """区间并集的长度：多个线程同时处于同一阶段时只计一次"""
+    total, current_start, current_end = 0.0, None, None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+@contextlib.contextmanager
+def timed(stage):
+    """统计一个阶段的耗时；同一线程内嵌套的同名阶段只计最外层"""
+    active = TIMING_STACK.__dict__.setdefault('stages', set())
+    if TIMINGS is None or stage in active:
+        yield
+        return
+    active.add(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.discard(stage)
+        record_timing(stage, start, time.perf_counter())
+
+def timed_stage(stage):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def timing_hook(response, *args, **kwargs):
+    """requests 响应钩子：记录每个请求的耗时和传输字节数（流式请求只计到响应头）"""
+    if TIMINGS is None:
+        return
+    if kwargs.get('stream'):
+        nbytes = int(response.headers.get('Content-Length') or 0)
+    else:
+        nbytes = len(response.content)
+    end = time.perf_counter()
+    record_timing('http', end - response.elapsed.total_seconds(), end, nbytes)
+
+def print_timings(total):
+    """输出各阶段耗时（写到 stderr，不影响数据输出）。session 阶段包含其中的 HTTP 请求。
+    wall ms 是该阶段实际占用的墙钟时间（并发线程的重叠部分只计一次），thread ms 是各线程耗时之和"""
+    print("\n[*] Timings:", file=sys.stderr)
+    print(f"    {'stage':<10} {'calls':>6} {'wall ms':>10} {'thread ms':>10} {'bytes':>12}", file=sys.stderr)
+    stages = TIMING_STAGES + sorted(set(TIMINGS) - set(TIMING_STAGES))
+    for stage in stages:
+        if stage not in TIMINGS:
+            continue
+        seconds, calls, nbytes, intervals = TIMINGS[stage]
+        print(f"    {stage:<10} {calls:>6} {wall_seconds(intervals) * 1000:>10.1f} {seconds * 1000:>10.1f} "
+              f"{nbytes or '':>12}", file=sys.stderr)
+    print(f"    {'total':<10} {'':>6} {total * 1000:>10.1f}", file=sys.stderr)
+
+# ===================== HTTP 传输层 =====================
+def accept_encoding():
+    """安装了 brotli 时额外接受 br 压缩"""
+    for module in ('brotli', 'brotlicffi'):
+        try:
+            __import__(module)
+            return 'gzip, deflate, br'
+        except ImportError:
+            continue
+    return 'gzip, deflate'
+
+def configure_session(session, pool_size=POOL_SIZE, compress=True):
+    """挂载带连接池和重试策略的 HTTPAdapter，所有命令共用同一套传输配置"""
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    retry = Retry(total=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset(['GET', 'HEAD']), respect_retry_after_header=True,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        # 按字节区间下载时必须拿到未压缩的原始内容
+        'Accept-Encoding': accept_encoding() if compress else 'identity',
+    })
+    session.hooks['response'] = [hook for hook in session.hooks['response']
+                                 if getattr(hook, '__name__', '') != 'timing_hook'] + [timing_hook]
+    return session
+
+def build_session(pool_size=POOL_SIZE, compress=True):
+    import requests
+    return configure_session(requests.Session(), pool_size, compress)
+
+# ===================== 文件读写 =====================
+HELD_LOCKS = threading.local()  # 当前线程已持有的锁，嵌套加同一把锁时直接通过
+
+@contextlib.contextmanager
+def file_lock(path, shared=False):
+    """在 path.lock 上加 fcntl 建议锁，协调多个并行的 CLI 进程和同一进程内的多个线程；
+    同一线程内可重入。没有 fcntl 的平台上不加锁"""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    held = HELD_LOCKS.__dict__.setdefault('paths', set())
+    if path in held:
+        yield
+        return
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def file_key(path):
+    """文件的 (mtime_ns, 大小)，不存在时为 None，用来判断文件是否被改写过"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def single_flight(path, message):
+    """装饰缓存刷新函数：同一时刻只有一个进程执行刷新。等锁期间 path 已被其他进程刷新时
+    不再重复请求，打印 message 并返回 True，由调用方直接读取新结果"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            before = file_key(path)
+            with file_lock(path):
+                if file_key(path) != before:
+                    print(message)
+                    return True
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w', **kwargs):
+    """先写同目录下的临时文件再 rename 覆盖，读者永远看不到写了一半的文件"""
+    import tempfile
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                    dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+JSON_CACHE = {}  # {路径: ((mtime_ns, size), 数据)}，shell 模式下常驻内存
+
+def read_json_cached(path):
+    """读取 JSON 文件；同一进程内文件没有变化时直接返回上次解析的结果"""
+    key = file_key(path)
+    if key is None:
+        raise FileNotFoundError(path)
+    cached = JSON_CACHE.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    JSON_CACHE[path] = (key, data)
+    return data
+
 # ===================== Session 管理 =====================
-def save_session(session):
+# session 只保存 cookie 和时间戳（JSON），加载时装入新建的连接池 session，
+# 不再 pickle 整个 requests.Session：文件更小、加载更快，也不依赖 requests 的内部结构
+COOKIE_FIELDS = ['name', 'value', 'domain', 'path', 'secure', 'expires']
+SESSION_CACHE = {}  # 同一进程内复用已加载的 session 及其连接池，session 文件变化后才重新加载
+
+def save_session(session, quiet=False):
+    now = datetime.now().isoformat()
+    cookies = [{**{field: getattr(cookie, field) for field in COOKIE_FIELDS}, "rest": cookie._rest}
+               for cookie in session.cookies]
     try:
-        with open(SESSION_FILE, 'wb') as f:
-            pickle.dump({"session": session, "timestamp": datetime.now()}, f)
-        print("[+] Session saved.")
+        with file_lock(SESSION_FILE), atomic_write(SESSION_FILE) as f:  # mkstemp 创建的文件权限为 0600
+            json.dump({"timestamp": now, "verified": now, "cookies": cookies}, f)
+        SESSION_CACHE.update(key=file_key(SESSION_FILE), session=session, verified=datetime.fromisoformat(now))
+        if os.path.exists(LEGACY_SESSION_FILE):
+            os.remove(LEGACY_SESSION_FILE)
+        if not quiet:
+            print("[+] Session saved.")
     except Exception as e:
         print(f"[!] Error saving session: {e}")
 
 def load_session():
+    """返回 (session, 上次确认有效的时间)"""
     if not os.path.exists(SESSION_FILE):
-        return None
+        return None, None
     try:
-        with open(SESSION_FILE, 'rb') as f:
-            data = pickle.load(f)
-            session = data["session"]
-            # 移除过期校验，直接返回session
-            return session
+        with file_lock(SESSION_FILE, shared=True):
+            key = file_key(SESSION_FILE)
+            if SESSION_CACHE.get('key') == key:
+                return SESSION_CACHE['session'], SESSION_CACHE['verified']
+            with open(SESSION_FILE, 'r') as f:
+                data = json.load(f)
+        from requests.cookies import create_cookie
+        session = build_session()
+        for cookie in data["cookies"]:
+            session.cookies.set_cookie(create_cookie(**cookie))
+        verified = datetime.fromisoformat(data["verified"])
+        SESSION_CACHE.update(key=key, session=session, verified=verified)
+        return session, verified
     except Exception as e:
         print(f"[!] Error loading session: {e}")
-        return None
+        return None, None
+
+def cookies_expired(session):
+    """没有 cookie 或有 cookie 已过期时视为失效"""
+    if not session.cookies:
+        return True
+    now = time.time()
+    return any(cookie.expires and cookie.expires < now for cookie in session.cookies)
+
+def probe_session(session):
+    """轻量校验：流式读取页面，找到 Logout 即停止，不下载整页"""
+    with session.get(MACHINES_URL, stream=True, timeout=HTTP_TIMEOUT) as response:
+        response.raise_for_status()
+        tail = b""
+        for chunk in response.iter_content(chunk_size=4096):
+            if b"Logout" in tail + chunk:
+                return True
+            tail = chunk[-len(b"Logout"):]
+    return False
 
 def login(session, username, password):
-    login_url = "https://hackmyvm.eu/login/auth.php"
+    import requests
     data = {"admin": username, "password_usuario": password}
     try:
-        response = session.post(login_url, data, allow_redirects=True, timeout=10)
+        response = session.post(LOGIN_URL, data, allow_redirects=True, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         if "Logout" not in response.text:
             print("[!] Login failed: Invalid credentials.")
@@ -100,34 +371,146 @@ def login(session, username, password):
         print(f"[!] Login error: {e}")
         return False
 
-def get_authenticated_session():
+@timed_stage('session')
+def get_authenticated_session(probe=True, force_login=False):
+    """返回已登录的 session。最近确认过有效且 cookie 未过期时不发请求；
+    probe=False 时由调用方用自己的第一次请求完成校验"""
+    import requests
     config = load_config()
     if not config:
         print("[!] No configuration found. Please run 'config' command first.")
         print("    Usage: python3 hmv.py config")
         sys.exit(1)
 
-    session = load_session()
-    if session:
+    before = file_key(SESSION_FILE)
+    session, verified = (None, None) if force_login else load_session()
+    if session and not cookies_expired(session):
+        if not probe or (verified and datetime.now() - verified < SESSION_VERIFY_INTERVAL):
+            print("[+] Using saved session.")
+            return session
         try:
-            response = session.get("https://hackmyvm.eu/machines/", timeout=10)
-            response.raise_for_status()
-            if "Logout" in response.text:
+            if probe_session(session):
+                save_session(session, quiet=True)
                 print("[+] Using saved session.")
                 return session
         except requests.RequestException:
-            print("[!] Saved session invalid, re-authenticating...")
+            pass
+        print("[!] Saved session invalid, re-authenticating...")
 
-    session = requests.Session()
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    })
-    if not login(session, config["username"], config["password"]):
-        sys.exit(1)
+    # 同一时刻只让一个进程登录；等锁期间其他进程已重新登录时直接使用它保存的 session
+    with file_lock(SESSION_FILE):
+        if file_key(SESSION_FILE) != before:
+            session, _ = load_session()
+            if session and not cookies_expired(session):
+                print("[+] Using session saved by another process.")
+                return session
+        session = build_session()
+        if not login(session, config["username"], config["password"]):
+            sys.exit(1)
     return session
 
+def looks_logged_out(response):
+    """session 在校验间隔内被服务器注销时，请求会被重定向到登录页，或返回不带 Logout 的页面。
+    checkflag.php 正常返回纯文本，不含 <html，不会误判"""
+    if '/login' in response.url or any('/login' in r.headers.get('Location', '') for r in response.history):
+        return True
+    return b'<html' in response.content[:2048].lower() and b'Logout' not in response.content
+
+def reauthenticate():
+    print("[!] Saved session invalid, re-authenticating...")
+    return get_authenticated_session(force_login=True)
+
+def get_authenticated_page(params=None):
+    """获取机器列表页，同时用这次响应校验 session，返回 (session, response)"""
+    session = get_authenticated_session(probe=False)
+    response = session.get(MACHINES_URL, params=params, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    if "Logout" in response.text:
+        save_session(session, quiet=True)
+        return session, response
+    print("[!] Saved session invalid, re-authenticating...")
+    session = get_authenticated_session(force_login=True)
+    response = session.get(MACHINES_URL, params=params, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    return session, response
+
+# ===================== HTML 解析 =====================
+HTML_PARSER = None  # 首次解析时确定：安装了 lxml 就用 lxml，否则用 html.parser
+
+# SoupStrainer 参数。机器列表页只解析内容列（含分页栏）和表格；writeup 页面几乎全是表格，
+# 用 html.parser 时限定范围反而更慢，只在 lxml 下启用
+MACHINES_STRAINER = {'class_': ['col-10', 'table-dark']}
+WRITEUPS_STRAINER = {'name': 'table'}
+WRITEUPS_STRAINER_PARSERS = ('lxml',)
+
+def html_parser():
+    global HTML_PARSER
+    if HTML_PARSER is None:
+        try:
+            import lxml  # noqa: F401  可选依赖，安装后解析速度明显更快
+            HTML_PARSER = 'lxml'
+        except ImportError:
+            HTML_PARSER = 'html.parser'
+    return HTML_PARSER
+
+@timed_stage('parse')
+def make_soup(html, parse_only=None):
+    """使用可用的最快解析器构建 soup，parse_only 为 SoupStrainer 参数"""
+    from bs4 import BeautifulSoup, SoupStrainer
+    strainer = SoupStrainer(**parse_only) if parse_only else None
+    return BeautifulSoup(html, html_parser(), parse_only=strainer)
+
+# ===================== 输出格式 =====================
+class RowWriter:
+    """按输出格式写出结果行。table 模式缓冲所有行后交给 render_table 一次输出（带颜色）；
+    jsonl/csv 模式每收到一行就立即写到 stream，不带颜色代码"""
+    def __init__(self, output_format, fields, render_table, stream=None):
+        self.format = output_format
+        self.fields = fields
+        self.render_table = render_table
+        self.stream = stream or sys.stdout
+        self.rows = []
+        self.count = 0
+        self.csv_writer = None
+        if output_format == "csv":
+            import csv
+            self.csv_writer = csv.DictWriter(self.stream, fieldnames=fields, extrasaction='ignore')
+            self.csv_writer.writeheader()
+
+    def write(self, row):
+        self.count += 1
+        if self.format == "table":
+            self.rows.append(row)
+            return
+        with timed('render'):
+            self.write_row(row)
+
+    def write_row(self, row):
+        if self.csv_writer:
+            self.csv_writer.writerow(row)
+        else:
+            self.stream.write(json.dumps({field: row.get(field, '') for field in self.fields},
+                                         ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        if self.format == "table" and self.rows:
+            self.render_table(self.rows)
+
 # ===================== 搜索模块 =====================
+def parse_total_pages(soup):
+    """从分页栏中读取总页数"""
+    page_element = soup.select_one("div.col-10 > div > div > div.container > nav > ul > li:nth-child(5) > a")
+    if not page_element or not page_element.text:
+        return 1
+    page_text = page_element.text.strip()
+    try:
+        return int(page_text.split('/')[1]) if '/' in page_text else 1
+    except (ValueError, IndexError):
+        return 1
+
 def get_total_pages(session, level=None, search=None, tag=None):
+    import requests
     if level:
         return 1
     try:
@@ -136,16 +519,11 @@ def get_total_pages(session, level=None, search=None, tag=None):
             params['v'] = search
         if tag:
             params['t'] = tag
-        response = session.get("https://hackmyvm.eu/machines/", params=params, timeout=10)
+        response = session.get(MACHINES_URL, params=params, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        page_element = soup.select_one("body > div.container-xxl > div > div.col-10 > div > div > div.container > nav > ul > li:nth-child(5) > a")
-        if not page_element or not page_element.text:
-            return 1
-        page_text = page_element.text.strip()
-        total_pages = int(page_text.split('/')[1]) if '/' in page_text else 1
-        return total_pages
-    except (requests.RequestException, ValueError, IndexError) as e:
+        soup = make_soup(response.text, MACHINES_STRAINER)
+        return parse_total_pages(soup)
+    except requests.RequestException as e:
         print(f"[!] Error fetching total pages: {e}")
         return 1
 
@@ -158,10 +536,74 @@ def color_level(level):
         return bcolors.FAIL + level + bcolors.ENDC
     return level
 
-def list_machines(level=None, search=None, tag=None, filter_level=None, page=1):
-    color_map = {'#28a745': 'easy', '#ffc107': 'medium', '#dc3545': 'hard'}
+def color_status(status):
+    if "TO HACK" in status:
+        return bcolors.WARNING + status + bcolors.ENDC
+    return bcolors.OKGREEN + status + bcolors.ENDC
+
+@timed_stage('parse')
+def parse_machines(soup):
+    """从机器列表页中提取机器信息"""
+    machines = []
+    for row in soup.select("table.mt-1.table.table-striped.table-dark tbody tr"):
+        try:
+            name = row.find('h4', class_='vmname').text.strip()
+            color_style = row.find('div', style=lambda s: s and 'border-top' in s)['style']
+            color = color_style.split('solid')[-1].strip().rstrip(';')
+            status_tag = row.find('span', class_='badge')
+            machines.append({
+                'name': name,
+                'level': LEVEL_COLOR_MAP.get(color.lower(), 'unknown'),
+                'status': status_tag.text.strip() if status_tag else "?",
+                'creator': row.find_all('td')[1].text.strip(),
+                'link': f"{MACHINE_DETAIL_URL}?vm={name}"
+            })
+        except Exception as e:
+            print(f"[!] Error processing machine: {e}")
+            continue
+    return machines
+
+def fetch_machine_page(session, params, page):
+    """获取并解析单页机器列表"""
+    response = session.get(MACHINES_URL, params={**params, 'p': page}, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    return parse_machines(make_soup(response.text, MACHINES_STRAINER))
+
+def iter_remaining_pages(session, params, total_pages):
+    """并发获取第 2..N 页，按页码顺序逐页产出机器列表"""
+    from concurrent.futures import ThreadPoolExecutor
+    pages = range(2, total_pages + 1)
+    if not pages:
+        return
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(pages))) as executor:
+        yield from executor.map(lambda p: fetch_machine_page(session, params, p), pages)
+
+def fetch_remaining_pages(session, params, total_pages):
+    """并发获取第 2..N 页，按页码顺序返回机器列表"""
+    return [machine for page_machines in iter_remaining_pages(session, params, total_pages)
+            for machine in page_machines]
+
+def crawl_machines(params):
+    """获取符合条件的所有页面的机器列表"""
+    session, response = get_authenticated_page(params)
+    soup = make_soup(response.text, MACHINES_STRAINER)
+    machines = parse_machines(soup)
+    if 'l' not in params:
+        machines.extend(fetch_remaining_pages(session, params, parse_total_pages(soup)))
+    return machines
+
+@timed_stage('render')
+def print_machines(machines):
+    from prettytable import PrettyTable
     machines_tab = PrettyTable(["Machine Name", "Level", "Status", "Creator", "Link"])
-    session = get_authenticated_session()
+    for machine in machines:
+        machines_tab.add_row([machine['name'], color_level(machine['level']), color_status(machine['status']),
+                              machine['creator'], machine['link']])
+    print(machines_tab)
+
+def list_machines(level=None, search=None, tag=None, filter_level=None, page=1, all_pages=False,
+                  output_format="table", stream=None):
+    import requests
     params = {}
     if level: params['l'] = level
     if page > 1 and not level: params['p'] = page
@@ -169,51 +611,354 @@ def list_machines(level=None, search=None, tag=None, filter_level=None, page=1):
     if tag: params['t'] = tag
 
     try:
-        response = session.get("https://hackmyvm.eu/machines/", params=params, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        rows = soup.select("table.mt-1.table.table-striped.table-dark tbody tr")
-        total_pages = get_total_pages(session, level, search, tag)
+        session, response = get_authenticated_page(params)
+        soup = make_soup(response.text, MACHINES_STRAINER)
+        # 第一页的分页栏已在本次响应中，无需再请求一次
+        if level:
+            total_pages = 1
+        elif page == 1:
+            total_pages = parse_total_pages(soup)
+        else:
+            total_pages = get_total_pages(session, level, search, tag)
         if not level and (page < 1 or page > total_pages):
             print(f"[!] Invalid page number. Must be between 1 and {total_pages}.")
             sys.exit(1)
 
-        machines = []
-        for row in rows:
-            try:
-                name = row.find('h4', class_='vmname').text.strip()
-                color_style = row.find('div', style=lambda s: s and 'border-top' in s)['style']
-                color = color_style.split('solid')[-1].strip().rstrip(';')
-                level_found = color_map.get(color.lower(), 'unknown')
-                level_colored = color_level(level_found)
-                status_tag = row.find('span', class_='badge')
-                status_text = status_tag.text.strip() if status_tag else "?"
-                creator = row.find_all('td')[1].text.strip()
-                link = f"https://hackmyvm.eu/machines/machine.php?vm={name}"
-                if filter_level and level_found.lower() != filter_level.lower():
-                    continue
-                status_colored = bcolors.WARNING + status_text + bcolors.ENDC if "TO HACK" in status_text else bcolors.OKGREEN + status_text + bcolors.ENDC
-                machines.append([name, level_colored, status_colored, creator, link])
-            except Exception as e:
-                print(f"[!] Error processing machine: {e}")
-                continue
+        writer = RowWriter(output_format, MACHINE_FIELDS, print_machines, stream)
+        pages = [parse_machines(soup)]
+        if all_pages and total_pages > 1:
+            print(f"[*] Fetching {total_pages} pages...")
+            pages = itertools.chain(pages, iter_remaining_pages(session, params, total_pages))
 
-        if not machines:
+        # jsonl/csv 模式下每页解析完即输出，不等待其余页面
+        for page_machines in pages:
+            for machine in page_machines:
+                if not filter_level or machine['level'].lower() == filter_level.lower():
+                    writer.write(machine)
+
+        if not writer.count:
             print("[!] No machines found.")
             sys.exit(1)
 
-        for machine in machines:
-            machines_tab.add_row(machine)
-
-        print(machines_tab)
+        writer.close()
         
         # 显示分页信息
-        if not level and total_pages > 1:
+        if all_pages:
+            print(f"\n[*] {writer.count} machine(s) across {total_pages} page(s)")
+        elif not level and total_pages > 1:
             print(f"\n[*] Page {page} of {total_pages}")
     except requests.RequestException as e:
         print(f"[!] Error fetching machines: {e}")
         sys.exit(1)
 
+# ===================== 机器目录缓存 =====================
+def needs_catalog_update():
+    """检查是否需要更新机器目录缓存"""
+    if not os.path.exists(CATALOG_FILE):
+        return True
+    try:
+        file_mod_time = datetime.fromtimestamp(os.path.getmtime(CATALOG_FILE))
+        return datetime.now() - file_mod_time > CATALOG_CACHE_TIMEOUT
+    except Exception:
+        return True
+
+@single_flight(CATALOG_FILE, "[+] Machine catalog was just updated by another process.")
+def fetch_and_update_catalog():
+    """抓取全部机器列表并保存到本地目录缓存"""
+    import requests
+    try:
+        print("[*] Crawling machine catalog from server...")
+        machines = crawl_machines({})
+        if not machines:
+            print("[!] No machines found.")
+            return False
+        with atomic_write(CATALOG_FILE, encoding='utf-8') as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "machines": machines}, f)
+        print(f"[+] Machine catalog updated successfully. ({len(machines)} machines)")
+        return True
+    except requests.RequestException as e:
+        print(f"[!] Error fetching machine catalog: {e}")
+        return False
+
+@timed_stage('cache')
+def load_catalog(refresh=False):
+    """加载机器目录，过期或指定 refresh 时重新抓取"""
+    if refresh or needs_catalog_update():
+        if not refresh:
+            print("[*] Machine catalog expired or missing, updating...")
+        if not fetch_and_update_catalog():
+            if os.path.exists(CATALOG_FILE):
+                print("[*] Using cached machine catalog (might be outdated).")
+            else:
+                print("[!] No machine catalog available.")
+                return []
+    try:
+        return read_json_cached(CATALOG_FILE).get("machines", [])
+    except Exception as e:
+        print(f"[!] Error reading machine catalog: {e}")
+        return []
+
+CATALOG_INDEX = {}  # 最近一次构建的索引；目录文件未变化时 read_json_cached 返回同一个列表，可直接复用
+
+def catalog_index(machines):
+    if CATALOG_INDEX.get('machines') is not machines:
+        CATALOG_INDEX.update(machines=machines, index=build_catalog_index(machines))
+    return CATALOG_INDEX['index']
+
+def build_catalog_index(machines):
+    """按等级、状态、作者和名称前缀建立内存索引"""
+    index = {'level': {}, 'status': {}, 'creator': {}, 'names': []}
+    for i, machine in enumerate(machines):
+        index['level'].setdefault(machine['level'].lower(), set()).add(i)
+        index['status'].setdefault(machine['status'].upper(), set()).add(i)
+        index['creator'].setdefault(machine['creator'].lower(), set()).add(i)
+        index['names'].append((machine['name'].lower(), i))
+    index['names'].sort()
+    return index
+
+def match_names(index, name):
+    """名称前缀匹配走有序索引；出现在名称中间的部分匹配无法用索引，退回线性扫描"""
+    name = name.lower()
+    names = index['names']
+    matched = set()
+    pos = bisect_left(names, (name, -1))
+    while pos < len(names) and names[pos][0].startswith(name):
+        matched.add(names[pos][1])
+        pos += 1
+    matched.update(i for vmname, i in names if name in vmname[1:])
+    return matched
+
+def query_catalog(machines, index, name=None, level=None, status=None, creator=None):
+    """按条件在本地目录中查询，返回按原顺序排列的机器"""
+    candidates = set(range(len(machines)))
+    if name:
+        candidates &= match_names(index, name)
+    if level:
+        candidates &= index['level'].get(level.lower(), set())
+    if status:
+        status = status.upper()
+        candidates &= set().union(*(ids for key, ids in index['status'].items() if status in key))
+    if creator:
+        candidates &= index['creator'].get(creator.lower(), set())
+    return [machines[i] for i in sorted(candidates)]
+
+def search_catalog(name=None, level=None, status=None, creator=None, refresh=False,
+                   output_format="table", stream=None):
+    """在本地机器目录中搜索，无需联网"""
+    machines = load_catalog(refresh)
+    if not machines:
+        sys.exit(1)
+    index = catalog_index(machines)
+    results = query_catalog(machines, index, name, level, status, creator)
+    if not results:
+        print("[!] No machines found.")
+        sys.exit(1)
+    writer = RowWriter(output_format, MACHINE_FIELDS, print_machines, stream)
+    for machine in results:
+        writer.write(machine)
+    writer.close()
+    print(f"\n[*] {len(results)} machine(s) from local catalog")
+
+# ===================== 机器详情 =====================
+DETAIL_LABELS = {'os': 'os', 'size': 'size', 'release': 'release', 'release date': 'release',
+                 'creator': 'creator', 'level': 'level', 'difficulty': 'level'}
+DETAIL_LABEL_RE = re.compile(r'^(%s)\s*:\s*(.*)$' % '|'.join(sorted(DETAIL_LABELS, key=len, reverse=True)),
+                             re.IGNORECASE)
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+def parse_size(value):
+    """解析 1.2 GB、800MB、10M 形式的大小（字节），格式不对时抛出 ValueError"""
+    match = re.fullmatch(r'([\d.]+)\s*([kmgt]?)i?b?', value.strip().lower())
+    if not match:
+        raise ValueError(f"invalid size: '{value}'")
+    return float(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+def size_arg(value):
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+@timed_stage('parse')
+def parse_machine_detail(html, name):
+    """从 machine.php 详情页提取 OS、大小、发布日期、标签和下载地址。
+    按 "Size:"、"OS:" 这类标签文本定位字段，标签和值可以在同一个或相邻的元素中"""
+    soup = make_soup(html)
+    content = soup.select_one('div.col-10') or soup
+    heading = content.select_one('.vmname')
+    name = heading.text.strip() if heading and heading.text.strip() else name
+    record = {'name': name, 'link': f"{MACHINE_DETAIL_URL}?vm={name}"}
+    lines = [line.strip() for line in content.get_text('\n').splitlines() if line.strip()]
+    for i, line in enumerate(lines):
+        match = DETAIL_LABEL_RE.match(line)
+        if not match:
+            continue
+        field = DETAIL_LABELS[match.group(1).lower()]
+        value = match.group(2).strip() or (lines[i + 1] if i + 1 < len(lines) else '')
+        record.setdefault(field, value)
+    if not any(field in record for field in ('os', 'size', 'release')):
+        return None
+    tags = dict.fromkeys(a.text.strip().lower() for a in content.select('a[href*="?t="], a[href*="&t="]') if a.text.strip())
+    record['tags'] = ', '.join(tags)
+    download = content.select_one('a[href$=".zip"]')
+    record['download'] = download['href'] if download else ''
+    if 'level' in record:
+        record['level'] = record['level'].lower()
+    return record
+
+def load_details():
+    """读取详情缓存：{小写机器名: {record, etag, last_modified, fetched}}"""
+    try:
+        return read_json_cached(DETAILS_FILE)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[!] Error reading machine details cache: {e}")
+        return {}
+
+def save_details(updates):
+    """在锁内重新读取再合并写回，不覆盖其他进程同时写入的记录"""
+    with file_lock(DETAILS_FILE):
+        details = load_details()
+        details.update(updates)
+        with atomic_write(DETAILS_FILE, encoding='utf-8') as f:
+            json.dump(details, f)
+
+def detail_is_fresh(entry):
+    try:
+        return datetime.now() - datetime.fromisoformat(entry['fetched']) < DETAIL_CACHE_TIMEOUT
+    except (KeyError, TypeError, ValueError):
+        return False
+
+def fetch_machine_detail(session, name, entry=None):
+    """获取单台机器的详情页，带上缓存的 ETag/Last-Modified 做条件请求。
+    返回 (状态, 缓存条目)，状态为 fetched/unchanged/not found/logged out/error"""
+    import requests
+    entry = entry or {}
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    try:
+        response = session.get(MACHINE_DETAIL_URL, params={'vm': name}, headers=headers, timeout=HTTP_TIMEOUT)
+        if response.status_code == 404:
+            return 'not found', None
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"[!] Error fetching details for {name}: {e}")
+        return 'error', None
+    now = datetime.now().isoformat()
+    if response.status_code == 304 and entry.get('record'):
+        return 'unchanged', {**entry, 'fetched': now}
+    record = parse_machine_detail(response.text, name)
+    if record is None:
+        return ('logged out' if looks_logged_out(response) else 'not found'), None
+    return 'fetched', {'record': record, 'etag': response.headers.get('ETag', ''),
+                       'last_modified': response.headers.get('Last-Modified', ''), 'fetched': now}
+
+def update_details(names, refresh=False, jobs=MAX_WORKERS):
+    """并发获取缓存中缺失或过期的机器详情（refresh 时全部重新校验），返回最新的缓存"""
+    from concurrent.futures import ThreadPoolExecutor
+    details = load_details()
+    stale = [name for name in names if refresh or not detail_is_fresh(details.get(name.lower()))]
+    if not stale:
+        return details
+    print(f"[*] Fetching details for {len(stale)} machine(s)...")
+    session = get_authenticated_session()
+    jobs = max(min(jobs, len(stale)), 1)
+    if jobs > POOL_SIZE:
+        configure_session(session, pool_size=jobs)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(lambda name: fetch_machine_detail(session, name, details.get(name.lower())),
+                                    stale))
+        retry = [i for i, (status, _) in enumerate(results) if status == 'logged out']
+        if retry:
+            session = reauthenticate()
+            if jobs > POOL_SIZE:
+                configure_session(session, pool_size=jobs)
+            retried = executor.map(lambda i: fetch_machine_detail(session, stale[i], details.get(stale[i].lower())),
+                                   retry)
+            for i, result in zip(retry, retried):
+                results[i] = result
+
+    updates, counts = {}, {}
+    for name, (status, entry) in zip(stale, results):
+        counts[status] = counts.get(status, 0) + 1
+        if entry:
+            updates[name.lower()] = entry
+        elif status == 'not found':
+            print(f"[!] Machine '{name}' not found.")
+    if updates:
+        save_details(updates)
+        details.update(updates)
+    print("[+] " + ", ".join(f"{count} {status}" for status, count in counts.items()))
+    return details
+
+def filter_details(records, level=None, os_name=None, tag=None, max_size=None):
+    """按等级、操作系统、标签和最大体积筛选详情记录"""
+    results = []
+    for record in records:
+        if level and record.get('level', '').lower() != level.lower():
+            continue
+        if os_name and os_name.lower() not in record.get('os', '').lower():
+            continue
+        if tag and tag.lower() not in [t.strip() for t in record.get('tags', '').split(',')]:
+            continue
+        if max_size is not None:
+            try:
+                if parse_size(record.get('size', '')) > max_size:
+                    continue
+            except ValueError:
+                continue
+        results.append(record)
+    return results
+
+@timed_stage('render')
+def print_details(records):
+    from prettytable import PrettyTable
+    details_tab = PrettyTable(["Machine Name", "Level", "OS", "Size", "Release", "Creator", "Tags"])
+    details_tab.align["Machine Name"] = "l"
+    details_tab.align["Tags"] = "l"
+    details_tab.max_width["Tags"] = 40
+    for record in records:
+        details_tab.add_row([record['name'], color_level(record.get('level', '')), record.get('os', ''),
+                             record.get('size', ''), record.get('release', ''), record.get('creator', ''),
+                             record.get('tags', '')])
+    print(details_tab)
+
+def machine_info(names=None, all_machines=False, level=None, os_name=None, tag=None, max_size=None,
+                 refresh=False, jobs=MAX_WORKERS, output_format="table", stream=None):
+    """显示机器详情。指定机器名或 --all 时先补齐缺失/过期的详情，否则只查询本地缓存"""
+    catalog = {}
+    if all_machines:
+        catalog = {machine['name'].lower(): machine for machine in load_catalog()}
+        if not catalog:
+            sys.exit(1)
+        names = [machine['name'] for machine in catalog.values()]
+    if names:
+        details = update_details(names, refresh, jobs)
+        records = [details[name.lower()]['record'] for name in names if name.lower() in details]
+    else:
+        records = [entry['record'] for entry in load_details().values()]
+        if not records:
+            print("[!] No machine details cached. Run 'info --all' or 'info <machine>' first.")
+            sys.exit(1)
+    # 详情页没有给出等级时用目录中按颜色识别的等级补上
+    for record in records:
+        if not record.get('level') and record['name'].lower() in catalog:
+            record['level'] = catalog[record['name'].lower()]['level']
+
+    results = filter_details(records, level, os_name, tag, max_size)
+    if not results:
+        print("[!] No machines found.")
+        sys.exit(1)
+    writer = RowWriter(output_format, DETAIL_FIELDS, print_details, stream)
+    for record in results:
+        writer.write(record)
+    writer.close()
+    print(f"\n[*] {len(results)} machine(s)")
+
 # ===================== Writeup 模块 =====================
 def needs_writeup_update():
     """检查是否需要更新 writeup 缓存"""
@@ -225,9 +970,11 @@ def needs_writeup_update():
     except Exception:
         return True
 
+@timed_stage('parse')
 def extract_writeups_from_html(html_content):
     """从HTML内容中提取WriteUp信息"""
-    soup = BeautifulSoup(html_content, 'html.parser')
+    parse_only = WRITEUPS_STRAINER if html_parser() in WRITEUPS_STRAINER_PARSERS else None
+    soup = make_soup(html_content, parse_only)
     writeups = []
     
     for row in soup.find_all('tr'):
@@ -242,18 +989,18 @@ def extract_writeups_from_html(html_content):
             machine_name = machine_link.get_text(strip=True) if machine_link else machine_cell.get_text(strip=True)
             if not machine_name or machine_name in ['Machine', 'machine']:
                 continue
-            machine_url = urljoin("https://hackmyvm.eu", machine_link.get('href', '')) if machine_link else ''
+            machine_url = urljoin(BASE_URL, machine_link.get('href', '')) if machine_link else ''
             
             # 提取作者信息
             author_cell = cells[1]
             author_link = author_cell.find('a')
             author_name = author_link.get_text(strip=True) if author_link else author_cell.get_text(strip=True)
-            author_url = urljoin("https://hackmyvm.eu", author_link.get('href', '')) if author_link else ''
+            author_url = urljoin(BASE_URL, author_link.get('href', '')) if author_link else ''
             
             # 提取头像和国家标志
             avatar_imgs = author_cell.find_all('img')
-            avatar_url = urljoin("https://hackmyvm.eu", avatar_imgs[0].get('src', '')) if avatar_imgs else ''
-            country_flag = urljoin("https://hackmyvm.eu", avatar_imgs[1].get('src', '')) if len(avatar_imgs) > 1 else ''
+            avatar_url = urljoin(BASE_URL, avatar_imgs[0].get('src', '')) if avatar_imgs else ''
+            country_flag = urljoin(BASE_URL, avatar_imgs[1].get('src', '')) if len(avatar_imgs) > 1 else ''
             
             # 提取语言和WriteUp链接
             language = cells[2].get_text(strip=True)
@@ -261,7 +1008,7 @@ def extract_writeups_from_html(html_content):
             writeup_link = writeup_cell.find('a')
             writeup_url = writeup_link.get('href', '') if writeup_link else ''
             if writeup_url and not writeup_url.startswith('http') and not writeup_url.startswith('//'):
-                writeup_url = urljoin("https://hackmyvm.eu", writeup_url)
+                writeup_url = urljoin(BASE_URL, writeup_url)
             
             writeups.append({
                 'vmname': machine_name,
@@ -280,16 +1027,43 @@ def extract_writeups_from_html(html_content):
     
     return writeups
 
+@single_flight(WRITEUP_FILE, "[+] Writeup data was just updated by another process.")
 def fetch_and_update_writeups():
-    """从服务器获取 writeup 数据并保存到本地"""
+    """从服务器获取 writeup 数据，只合并有变化的记录"""
+    import hashlib
+    import requests
     session = get_authenticated_session()
-    writeup_url = "https://hackmyvm.eu/hmv/writeupz.php"
     
+    conn = None
     try:
+        meta = read_writeup_meta()
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        
         print("[*] Fetching writeup data from server...")
-        response = session.get(writeup_url, timeout=15)
+        response = session.get(WRITEUPS_URL, headers=headers, timeout=HTTP_TIMEOUT)
+        if response.status_code != 304 and looks_logged_out(response):
+            response = reauthenticate().get(WRITEUPS_URL, headers=headers, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         
+        # 服务器返回 304 或内容哈希未变化时无需解析
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        if response.status_code == 304 or content_hash == meta.get('content_sha256'):
+            conn = open_writeup_db()
+            with conn:
+                if response.status_code == 304:
+                    set_writeup_meta(conn, refreshed_at=datetime.now().isoformat())
+                else:
+                    # 内容没变但服务器这次给了新的校验信息，保存下来，之后才能拿到 304
+                    set_writeup_meta(conn, etag=response.headers.get('ETag', ''),
+                                     last_modified=response.headers.get('Last-Modified', ''),
+                                     refreshed_at=datetime.now().isoformat())
+            print("[+] Writeup data is already up to date.")
+            return True
+        
         # 解析HTML内容
         writeups = extract_writeups_from_html(response.text)
         
@@ -297,15 +1071,16 @@ def fetch_and_update_writeups():
             print("[!] No writeup data found.")
             return False
         
-        # 保存CSV数据到本地文件
-        fieldnames = ['vmname', 'machine_url', 'author', 'author_url', 'avatar_url', 'country_flag', 'language', 'writeup']
-        
-        with open(WRITEUP_FILE, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(writeups)
+        # 合并到本地索引库
+        conn = open_writeup_db()
+        init_writeup_db(conn)
+        with conn:
+            added, removed = merge_writeups(conn, writeups)
+            set_writeup_meta(conn, etag=response.headers.get('ETag', ''),
+                             last_modified=response.headers.get('Last-Modified', ''),
+                             content_sha256=content_hash, refreshed_at=datetime.now().isoformat())
         
-        print(f"[+] Writeup data updated successfully. ({len(writeups)} records)")
+        print(f"[+] Writeup data updated successfully. ({added} added, {removed} removed)")
         return True
     except requests.RequestException as e:
         print(f"[!] Error fetching writeup data: {e}")
@@ -313,109 +1088,885 @@ def fetch_and_update_writeups():
     except Exception as e:
         print(f"[!] Error processing writeup data: {e}")
         return False
+    finally:
+        if conn is not None:
+            conn.close()
+
+def open_writeup_db():
+    import sqlite3
+    conn = sqlite3.connect(WRITEUP_FILE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def has_writeup_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'writeups_fts'").fetchone() is not None
+
+def init_writeup_db(conn):
+    """创建 writeup 索引库：按机器名、作者、语言建索引，机器名另建 trigram 全文索引"""
+    import sqlite3
+    with conn:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS writeups ({', '.join(WRITEUP_FIELDS)}, position INTEGER)")
+        conn.execute("CREATE TABLE IF NOT EXISTS writeup_meta (key TEXT PRIMARY KEY, value TEXT)")
+        # position 为该行在服务器页面上的序号，查询按它排序。旧版本建的表没有这一列：
+        # 先按插入顺序补上，并清掉校验信息，让下次刷新完整合并一遍来纠正顺序
+        if 'position' not in [row[1] for row in conn.execute("PRAGMA table_info(writeups)")]:
+            conn.execute("ALTER TABLE writeups ADD COLUMN position INTEGER")
+            conn.execute("UPDATE writeups SET position = rowid")
+            conn.execute("DELETE FROM writeup_meta WHERE key IN ('etag', 'last_modified', 'content_sha256')")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_writeups_vmname ON writeups (vmname COLLATE NOCASE)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_writeups_author ON writeups (author COLLATE NOCASE)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_writeups_language ON writeups (language COLLATE NOCASE)")
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'writeups_ai'").fetchone():
+            return
+        try:
+            conn.execute("DROP TABLE IF EXISTS writeups_fts")
+            conn.execute("CREATE VIRTUAL TABLE writeups_fts USING fts5("
+                         "vmname, content='writeups', tokenize='trigram')")
+            conn.execute("INSERT INTO writeups_fts (writeups_fts) VALUES ('rebuild')")
+            # 触发器让全文索引随增删的行同步更新
+            conn.execute("CREATE TRIGGER writeups_ai AFTER INSERT ON writeups BEGIN "
+                         "INSERT INTO writeups_fts (rowid, vmname) VALUES (new.rowid, new.vmname); END")
+            conn.execute("CREATE TRIGGER writeups_ad AFTER DELETE ON writeups BEGIN "
+                         "INSERT INTO writeups_fts (writeups_fts, rowid, vmname) "
+                         "VALUES ('delete', old.rowid, old.vmname); END")
+        except sqlite3.OperationalError:
+            pass  # SQLite 未编译 FTS5 或不支持 trigram 时退回 LIKE 查询
+
+def read_writeup_meta():
+    """读取上次刷新记录的 ETag、Last-Modified 和内容哈希"""
+    import sqlite3
+    if not os.path.exists(WRITEUP_FILE):
+        return {}
+    conn = open_writeup_db()
+    try:
+        return {row['key']: row['value'] for row in conn.execute("SELECT key, value FROM writeup_meta")}
+    except sqlite3.Error:
+        return {}
+    finally:
+        conn.close()
+
+def set_writeup_meta(conn, **values):
+    conn.executemany("INSERT OR REPLACE INTO writeup_meta (key, value) VALUES (?, ?)", values.items())
+
+def merge_writeups(conn, writeups):
+    """删除服务器上已不存在的行并插入新增或变化的行，返回 (新增数, 删除数)。
+    保留下来的行只更新 position，查询结果始终与服务器页面上的顺序一致"""
+    existing = {}
+    for row in conn.execute(f"SELECT rowid, position, {', '.join(WRITEUP_FIELDS)} FROM writeups"):
+        existing[tuple(row[field] for field in WRITEUP_FIELDS)] = (row['rowid'], row['position'])
+    incoming = set()
+    added, moved = [], []
+    for writeup in writeups:
+        key = tuple(writeup.get(field, '') for field in WRITEUP_FIELDS)
+        if key in incoming:
+            continue
+        position = len(incoming)
+        incoming.add(key)
+        if key not in existing:
+            added.append(key + (position,))
+        elif existing[key][1] != position:
+            moved.append((position, existing[key][0]))
+    removed = [(rowid,) for key, (rowid, _) in existing.items() if key not in incoming]
+    conn.executemany("DELETE FROM writeups WHERE rowid = ?", removed)
+    conn.executemany("UPDATE writeups SET position = ? WHERE rowid = ?", moved)
+    conn.executemany(f"INSERT INTO writeups ({', '.join(WRITEUP_FIELDS)}, position) "
+                     f"VALUES ({', '.join('?' * (len(WRITEUP_FIELDS) + 1))})", added)
+    return len(added), len(removed)
+
+def refresh_writeups_in_background():
+    """在独立进程中刷新 writeup 缓存，当前命令继续使用旧数据"""
+    import subprocess
+    try:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "writeup", "--refresh"],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+        return True
+    except OSError:
+        return False
+
+def query_writeups(conn, machine_name=None, author=None, language=None):
+    """按机器名（部分匹配）、作者和语言查询 writeup"""
+    return list(iter_writeups(conn, machine_name, author, language))
+
+def iter_writeups(conn, machine_name=None, author=None, language=None):
+    """query_writeups 的流式版本，逐行产出查询结果"""
+    clauses, params = [], []
+    if machine_name:
+        if len(machine_name) >= 3 and has_writeup_fts(conn):
+            clauses.append("rowid IN (SELECT rowid FROM writeups_fts WHERE vmname MATCH ?)")
+            params.append('"' + machine_name.replace('"', '""') + '"')
+        else:
+            escaped = machine_name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            clauses.append("vmname LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+    if author:
+        clauses.append("author = ? COLLATE NOCASE")
+        params.append(author)
+    if language:
+        clauses.append("language = ? COLLATE NOCASE")
+        params.append(language)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    for row in conn.execute(f"SELECT * FROM writeups{where} ORDER BY position, rowid", params):
+        yield dict(row)
 
 def load_writeups():
-    """加载 writeup 数据"""
-    # 检查是否需要更新缓存
+    """加载 writeup 索引库，返回数据库连接"""
+    import sqlite3
+    # 检查是否需要更新缓存；已有缓存时在后台刷新，不阻塞本次查询
     if needs_writeup_update():
-        print("[*] Writeup cache expired or missing, updating...")
-        if not fetch_and_update_writeups():
-            if os.path.exists(WRITEUP_FILE):
-                print("[*] Using cached writeup data (might be outdated).")
-            else:
-                print("[!] No writeup data available.")
-                return []
+        if os.path.exists(WRITEUP_FILE) and refresh_writeups_in_background():
+            print("[*] Writeup cache expired, refreshing in background...")
+        else:
+            print("[*] Writeup cache expired or missing, updating...")
+            if not fetch_and_update_writeups():
+                if os.path.exists(WRITEUP_FILE):
+                    print("[*] Using cached writeup data (might be outdated).")
+                else:
+                    print("[!] No writeup data available.")
+                    return None
     
-    # 读取本地 CSV 文件
-    writeups = []
     try:
-        with open(WRITEUP_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                writeups.append(row)
-        return writeups
-    except Exception as e:
+        conn = open_writeup_db()
+        init_writeup_db(conn)  # 表和索引都已存在时不做任何写入，只为升级旧版本的库
+        return conn
+    except sqlite3.Error as e:
         print(f"[!] Error reading writeup data: {e}")
-        return []
+        return None
 
-def search_writeups(machine_name):
-    """搜索指定机器的 writeup"""
-    writeups = load_writeups()
-    
-    if not writeups:
-        print("[!] No writeup data available.")
-        return
-    
-    # 搜索匹配的机器名（模糊匹配）
-    matching_writeups = []
-    for writeup in writeups:
-        if machine_name.lower() in writeup.get('vmname', '').lower():
-            matching_writeups.append(writeup)
-    
-    if not matching_writeups:
-        print(f"[!] No writeups found for machine: {machine_name}")
-        return
-    
+def describe_writeup_query(machine_name=None, author=None, language=None):
+    parts = []
+    if machine_name:
+        parts.append(f"'{machine_name}'")
+    if author:
+        parts.append(f"author '{author}'")
+    if language:
+        parts.append(f"language '{language}'")
+    return ", ".join(parts)
+
+def color_language(language):
+    if language.lower() in ['english', 'en']:
+        return bcolors.OKGREEN + language + bcolors.ENDC
+    elif language.lower() in ['spanish', 'español', 'es']:
+        return bcolors.WARNING + language + bcolors.ENDC
+    elif language.lower() in ['chinese', 'zh', '中文']:
+        return bcolors.FAIL + language + bcolors.ENDC
+    return language
+
+@timed_stage('render')
+def print_writeups(writeups, query):
+    from prettytable import PrettyTable
     # 创建表格显示结果
     writeup_table = PrettyTable(["Machine", "Author", "Language", "Writeup Link"])
     writeup_table.align = "l"
     writeup_table.max_width["Writeup Link"] = 50
     
-    for writeup in matching_writeups:
+    for writeup in writeups:
         machine = writeup.get('vmname', 'N/A')
         author = writeup.get('author', 'N/A')
         language = writeup.get('language', 'N/A')
         link = writeup.get('writeup', 'N/A')
-        
-        # 为语言添加颜色
-        if language.lower() in ['english', 'en']:
-            language_colored = bcolors.OKGREEN + language + bcolors.ENDC
-        elif language.lower() in ['spanish', 'español', 'es']:
-            language_colored = bcolors.WARNING + language + bcolors.ENDC
-        elif language.lower() in ['chinese', 'zh', '中文']:
-            language_colored = bcolors.FAIL + language + bcolors.ENDC
-        else:
-            language_colored = language
-        
-        writeup_table.add_row([machine, author, language_colored, link])
+        writeup_table.add_row([machine, author, color_language(language), link])
     
-    print(f"\n[*] Found {len(matching_writeups)} writeup(s) for '{machine_name}':")
+    print(f"\n[*] Found {len(writeups)} writeup(s) for {query}:")
     print(writeup_table)
 
+def search_writeups(machine_name=None, author=None, language=None, output_format="table", stream=None):
+    """搜索指定机器、作者或语言的 writeup"""
+    import sqlite3
+    conn = load_writeups()
+    
+    if conn is None:
+        print("[!] No writeup data available.")
+        return
+    
+    query = describe_writeup_query(machine_name, author, language)
+    writer = RowWriter(output_format, WRITEUP_FIELDS, lambda rows: print_writeups(rows, query), stream)
+    try:
+        for writeup in iter_writeups(conn, machine_name, author, language):
+            writer.write(writeup)
+        # 机器名拼错时，只有一个很接近的已知机器名就直接改查它。仅限 table 输出：
+        # jsonl/csv 通常接在管道里，换成别的机器的数据调用方无从察觉，只给出提示
+        corrected = (correct_machine_name(machine_name)
+                     if machine_name and not writer.count and output_format == "table" else None)
+        if corrected:
+            print(f"[*] No writeups match '{machine_name}', showing '{corrected}' instead.")
+            query = describe_writeup_query(corrected, author, language)
+            for writeup in iter_writeups(conn, corrected, author, language):
+                writer.write(writeup)
+    except sqlite3.Error as e:
+        print(f"[!] Error reading writeup data: {e}")
+        return
+    finally:
+        conn.close()
+    
+    if not writer.count:
+        print(f"[!] No writeups found for {query}")
+        suggestions = fuzzy_match(machine_name) if machine_name else []
+        if suggestions:
+            print(f"[*] Did you mean: {', '.join(name for name, _ in suggestions)}?")
+        return
+    writer.close()
+
+# ===================== 机器名匹配 =====================
+NAME_INDEX = {}  # 由本地缓存构建的机器名 trigram 索引，缓存文件变化后重建
+FUZZY_CANDIDATES = 50  # trigram 粗排后参与编辑距离精排的候选数
+
+def name_trigrams(name):
+    padded = f"${name.lower()}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a, b):
+    """Levenshtein 编辑距离"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+def known_machine_names():
+    """本地缓存（机器目录、writeup 库、详情缓存）中出现过的机器名，不发任何请求。
+    大小写以机器目录为准"""
+    import sqlite3
+    names = {}
+    with contextlib.suppress(Exception):
+        names.update((key, entry['record']['name']) for key, entry in load_details().items())
+    if os.path.exists(WRITEUP_FILE):
+        conn = open_writeup_db()
+        try:
+            names.update((row[0].lower(), row[0]) for row in conn.execute("SELECT DISTINCT vmname FROM writeups"))
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+    with contextlib.suppress(Exception):
+        names.update((machine['name'].lower(), machine['name'])
+                     for machine in read_json_cached(CATALOG_FILE).get("machines", []))
+    names.pop('', None)
+    return sorted(names.values(), key=str.lower)
+
+def machine_name_index():
+    """返回 {'names', 'lower', 'grams'}：机器名列表、小写名到下标的映射和 trigram 倒排索引"""
+    key = (file_key(CATALOG_FILE), file_key(WRITEUP_FILE), file_key(DETAILS_FILE))
+    if NAME_INDEX.get('key') != key:
+        names = known_machine_names()
+        grams = {}
+        for i, name in enumerate(names):
+            for gram in name_trigrams(name):
+                grams.setdefault(gram, []).append(i)
+        NAME_INDEX.update(key=key, index={'names': names, 'lower': {name.lower(): i for i, name in enumerate(names)},
+                                          'grams': grams})
+    return NAME_INDEX['index']
+
+def fuzzy_match(query, index=None, limit=5):
+    """用 trigram 倒排索引取出候选，按 Dice 系数粗排后再按编辑距离精排，返回 [(机器名, 编辑距离)]。
+    编辑距离超过 max(1, 名称长度/3) 的候选不算相近"""
+    index = index or machine_name_index()
+    query = query.lower()
+    query_grams = name_trigrams(query)
+    shared = {}
+    for gram in query_grams:
+        for i in index['grams'].get(gram, ()):
+            shared[i] = shared.get(i, 0) + 1
+    candidates = sorted(shared, key=lambda i: -2 * shared[i] / (len(query_grams)
+                                                                + len(name_trigrams(index['names'][i]))))[:FUZZY_CANDIDATES]
+    max_distance = max(1, len(query) // 3)
+    ranked = sorted((edit_distance(query, index['names'][i].lower()), -shared[i], index['names'][i])
+                    for i in candidates)
+    return [(name, distance) for distance, _, name in ranked if distance <= max_distance][:limit]
+
+def correct_machine_name(name):
+    """只有一个编辑距离为 1 的相近机器名时返回它，否则返回 None"""
+    matches = fuzzy_match(name, limit=2)
+    if matches and matches[0][1] == 1 and (len(matches) == 1 or matches[1][1] > 1):
+        return matches[0][0]
+    return None
+
+def check_machine_names(names):
+    """在发请求前检查用户给出的机器名。本地缓存里没有、但有相近名字时给出提示并返回 False；
+    没有本地数据或找不到相近名字（可能是新机器）时放行。目录已过期时先更新目录再判断"""
+    index = machine_name_index()
+    if not index['names']:
+        return True
+    unknown = [name for name in names if name.lower() not in index['lower']]
+    if unknown and needs_catalog_update():
+        print("[*] Machine catalog expired, updating before checking machine names...")
+        fetch_and_update_catalog()
+        index = machine_name_index()
+        unknown = [name for name in unknown if name.lower() not in index['lower']]
+    ok = True
+    for name in unknown:
+        suggestions = fuzzy_match(name, index)
+        if suggestions:
+            print(f"[!] Unknown machine '{name}'. Did you mean: {', '.join(s for s, _ in suggestions)}?")
+            ok = False
+    if not ok:
+        print("[*] If this is a new machine, pass --force to skip this check.")
+    return ok
+
 # ===================== 下载模块 =====================
-def download_machine(machine_name):
-    filename = f"{machine_name.lower()}.zip"
-    url = f"https://downloads.hackmyvm.eu/{filename}"
+class RangeIgnored(Exception):
+    """HEAD 声明支持 Range，但区间请求返回了完整文件（200）"""
+
+class DownloadProgress:
+    """多线程共享的下载进度，输出吞吐量和剩余时间"""
+    def __init__(self, total, done=0, show=True):
+        self.total = total
+        self.show = show
+        self.done = done
+        self.start_done = done
+        self.start_time = time.monotonic()
+        self.last_render = 0
+        self.lock = threading.Lock()
+
+    def add(self, nbytes):
+        with self.lock:
+            self.done += nbytes
+            now = time.monotonic()
+            if self.show and now - self.last_render >= 0.5:
+                self.last_render = now
+                self.render(now)
+
+    def speed(self, now=None):
+        elapsed = (now or time.monotonic()) - self.start_time
+        return (self.done - self.start_done) / elapsed if elapsed > 0 else 0
+
+    def render(self, now=None):
+        speed = self.speed(now)
+        mib = 1024 * 1024
+        line = f"\r[*] {self.done / mib:,.1f} MiB  {speed / mib:,.1f} MiB/s"
+        if self.total:
+            eta = (self.total - self.done) / speed if speed else 0
+            line = (f"\r[*] {self.done * 100 / self.total:5.1f}%  {self.done / mib:,.1f}/{self.total / mib:,.1f} MiB"
+                    f"  {speed / mib:,.1f} MiB/s  ETA {int(eta // 60):02d}:{int(eta % 60):02d}")
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+    def finish(self):
+        if not self.show:
+            return
+        self.render()
+        sys.stdout.write("\n")
+
+class RateLimiter:
+    """令牌桶限速器，所有下载线程共享同一个总带宽"""
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+def parse_rate(value):
+    """解析 500K、10M、1G 形式的速率（字节/秒）"""
     try:
-        print(f"[+] Downloading {filename} from HackMyVM...")
-        response = requests.get(url, stream=True, timeout=10)
+        rate = parse_size(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate: '{value}'")
+    if rate <= 0:
+        raise argparse.ArgumentTypeError("rate must be positive")
+    return rate
+
+def write_at(fd, data, offset, lock):
+    """在指定偏移写入数据，没有 os.pwrite 的平台退回 lseek+write"""
+    if hasattr(os, 'pwrite'):
+        os.pwrite(fd, data, offset)
+        return
+    with lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        os.write(fd, data)
+
+def probe_download(session, url):
+    """HEAD 请求获取文件大小以及服务器是否支持 Range"""
+    response = session.head(url, allow_redirects=True, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    size = int(response.headers.get('Content-Length') or 0)
+    accepts_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+    return size, accepts_ranges
+
+def plan_segments(size, segments):
+    """把文件切分为若干个闭区间 [start, end]，pos 为下一个待写入的字节"""
+    step = -(-size // segments)
+    return [{"start": start, "end": min(start + step, size) - 1, "pos": start}
+            for start in range(0, size, step)]
+
+def load_download_state(state_file, url, size):
+    """读取断点续传状态，与当前文件不符时丢弃"""
+    if not os.path.exists(state_file):
+        return None
+    try:
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+        if state.get("url") == url and state.get("size") == size:
+            return state
+    except (json.JSONDecodeError, OSError):
+        pass
+    return None
+
+def save_download_state(state_file, state):
+    with atomic_write(state_file) as f:
+        json.dump(state, f)
+
+def download_segment(session, url, fd, segment, progress, stop, lock, on_flush, limiter=None, hasher=None):
+    """下载单个字节区间；连接中途断开或读超时时从已写入的位置重试"""
+    import requests
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            return fetch_segment(session, url, fd, segment, progress, stop, lock, on_flush, limiter, hasher)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+            if attempt == HTTP_RETRIES or stop.is_set():
+                raise
+            time.sleep(HTTP_BACKOFF * 2 ** attempt)
+
+def fetch_segment(session, url, fd, segment, progress, stop, lock, on_flush, limiter=None, hasher=None):
+    """下载单个字节区间并原地写入 .part 文件"""
+    import requests
+    headers = {'Range': f"bytes={segment['pos']}-{segment['end']}"}
+    with session.get(url, headers=headers, stream=True, timeout=HTTP_TIMEOUT) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise RangeIgnored()
+        unflushed = 0
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            if stop.is_set():
+                return
+            if limiter:
+                limiter.acquire(len(chunk))
+            write_at(fd, chunk, segment['pos'], lock)
+            if hasher:
+                hasher.update(chunk, segment['pos'])
+            segment['pos'] += len(chunk)
+            progress.add(len(chunk))
+            unflushed += len(chunk)
+            if unflushed >= DOWNLOAD_STATE_INTERVAL:
+                unflushed = 0
+                on_flush()
+    if segment['pos'] <= segment['end']:
+        raise requests.ConnectionError(f"connection closed at byte {segment['pos']}")
+
+def download_ranges(session, url, part_file, state_file, size, segments, stop=None, limiter=None, show=True,
+                    hasher=None):
+    """多连接并行下载，被中断时保存未完成区间以便续传"""
+    from concurrent.futures import ThreadPoolExecutor
+    state = load_download_state(state_file, url, size)
+    if state and os.path.exists(part_file):
+        print("[*] Resuming interrupted download...")
+    else:
+        state = {"url": url, "size": size, "segments": plan_segments(size, segments)}
+    pending = [seg for seg in state["segments"] if seg["pos"] <= seg["end"]]
+    done = size - sum(seg["end"] - seg["pos"] + 1 for seg in pending)
+
+    fd = os.open(part_file, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o666)
+    lock = threading.Lock()
+    stop = stop or threading.Event()
+
+    def flush_state():
+        with lock:
+            save_download_state(state_file, state)
+
+    try:
+        if os.fstat(fd).st_size != size:
+            os.ftruncate(fd, size)
+        flush_state()
+        progress = DownloadProgress(size, done, show)
+        with ThreadPoolExecutor(max_workers=max(len(pending), 1)) as executor:
+            futures = [executor.submit(download_segment, session, url, fd, seg, progress, stop, lock,
+                                       flush_state, limiter, hasher)
+                       for seg in pending]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                stop.set()
+                raise
+        if stop.is_set():
+            raise KeyboardInterrupt
+        progress.finish()
+    except BaseException:
+        flush_state()
+        raise
+    finally:
+        os.close(fd)
+    os.remove(state_file)
+
+def download_stream(session, url, part_file, stop=None, limiter=None, show=True, hasher=None):
+    """服务器不支持 Range 时的单连接下载"""
+    with session.get(url, stream=True, timeout=HTTP_TIMEOUT) as response:
         response.raise_for_status()
-        with open(filename, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
+        progress = DownloadProgress(int(response.headers.get('Content-Length') or 0), show=show)
+        with open(part_file, "wb") as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if stop and stop.is_set():
+                    raise KeyboardInterrupt
+                if limiter:
+                    limiter.acquire(len(chunk))
+                if hasher:
+                    hasher.update(chunk, f.tell())
                 f.write(chunk)
+                progress.add(len(chunk))
+        progress.finish()
+
+def download_machine(machine_name, segments=DOWNLOAD_SEGMENTS, stop=None, limiter=None, show=True,
+                     verify=False, extract=False, session=None):
+    """下载单台机器，返回用于汇总表的结果"""
+    import zipfile
+    import requests
+    filename = f"{machine_name.lower()}.zip"
+    url = f"{DOWNLOAD_BASE_URL}/{filename}"
+    part_file = filename + ".part"
+    state_file = part_file + ".json"
+    result = {"machine": machine_name, "file": filename, "size": 0, "seconds": 0, "status": "failed"}
+    session = session or build_session(pool_size=max(segments, 1), compress=False)
+    start = time.monotonic()
+    try:
+        size, accepts_ranges = probe_download(session, url)
+        if size and os.path.exists(filename) and not os.path.exists(part_file) \
+                and os.path.getsize(filename) == size:
+            print(f"[*] {filename} already downloaded, skipping.")
+            result.update(size=size, status="skipped")
+            if verify or extract:
+                finish_archive(filename, None, verify, extract)
+            return result
+        print(f"[+] Downloading {filename} from HackMyVM...")
+        hasher = PrefixHasher() if verify else None
+        try:
+            if not (size and accepts_ranges):
+                raise RangeIgnored()
+            download_ranges(session, url, part_file, state_file, size, max(segments, 1), stop, limiter, show,
+                            hasher=hasher)
+        except RangeIgnored:
+            if size and accepts_ranges:
+                # 续传状态对这个服务器没有意义，丢弃后改为单连接完整下载
+                print("\n[*] Server ignored the Range request, downloading in a single stream...")
+                for path in (state_file, part_file):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+                hasher = PrefixHasher() if verify else None
+            download_stream(session, url, part_file, stop, limiter, show, hasher=hasher)
+        digest = hasher.finish(part_file) if hasher else None
+        os.replace(part_file, filename)
+        result.update(size=os.path.getsize(filename), status="downloaded")
         print(f"[✓] {machine_name} downloaded successfully.")
-    except requests.exceptions.HTTPError:
-        print(f"[!] Machine '{machine_name}' not found.")
+        if verify or extract:
+            finish_archive(filename, digest, verify, extract)
+    except requests.exceptions.HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            # 区间请求重试耗尽后返回的 416/5xx 等：保留 .part 和状态文件，可以续传
+            print(f"\n[!] Download error: {e}")
+            if os.path.exists(state_file):
+                print("[*] Run the same command again to resume.")
+        else:
+            print(f"[!] Machine '{machine_name}' not found.")
+            result["status"] = "not found"
     except requests.RequestException as e:
-        print(f"[!] Download error: {e}")
+        print(f"\n[!] Download error: {e}")
+        if os.path.exists(state_file):
+            print("[*] Run the same command again to resume.")
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"[!] Error processing {filename}: {e}")
+        result["status"] = "corrupt" if isinstance(e, zipfile.BadZipFile) else "failed"
+    except KeyboardInterrupt:
+        print(f"\n[!] Download of {filename} interrupted.")
+        result["status"] = "interrupted"
+        if os.path.exists(state_file):
+            print("[*] Run the same command again to resume.")
+    finally:
+        result["seconds"] = time.monotonic() - start
+    return result
+
+@timed_stage('render')
+def print_download_summary(results):
+    from prettytable import PrettyTable
+    summary_tab = PrettyTable(["Machine", "File", "Size (MiB)", "Time (s)", "MiB/s", "Status"])
+    summary_tab.align["Machine"] = "l"
+    summary_tab.align["File"] = "l"
+    mib = 1024 * 1024
+    for result in results:
+        downloaded = result["status"] == "downloaded" and result["seconds"] > 0
+        speed = f"{result['size'] / mib / result['seconds']:.1f}" if downloaded else "-"
+        summary_tab.add_row([result["machine"], result["file"], f"{result['size'] / mib:.1f}",
+                             f"{result['seconds']:.1f}", speed, result["status"]])
+    print(summary_tab)
+
+def download_machines(machine_names, jobs=DOWNLOAD_JOBS, segments=DOWNLOAD_SEGMENTS, rate=None,
+                      verify=False, extract=False):
+    """批量下载：限制同时下载的文件数和总带宽，最后打印汇总表"""
+    from concurrent.futures import ThreadPoolExecutor
+    limiter = RateLimiter(rate) if rate else None
+    stop = threading.Event()
+    jobs = max(min(jobs, len(machine_names)), 1)
+    show = jobs == 1  # 多个文件同时下载时不显示逐行进度
+    session = build_session(pool_size=jobs * max(segments, 1), compress=False)
+    results = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(download_machine, name, segments, stop, limiter, show, verify, extract, session)
+                   for name in machine_names]
+        try:
+            for future in futures:
+                results.append(future.result())
+        except KeyboardInterrupt:
+            stop.set()
+            print("\n[!] Interrupted, stopping downloads...")
+            results = [future.result() for future in futures if not future.cancel()]
+    print_download_summary(results)
+    return results
+
+def machines_from_search(level=None, search=None, tag=None):
+    """按 search 命令相同的条件获取机器名列表"""
+    import requests
+    params = {}
+    if level: params['l'] = level
+    if search: params['v'] = search
+    if tag: params['t'] = tag
+    try:
+        return [machine['name'] for machine in crawl_machines(params)]
+    except requests.RequestException as e:
+        print(f"[!] Error fetching machines: {e}")
+        sys.exit(1)
+
+# ===================== 校验与解压 =====================
+class PrefixHasher:
+    """随下载增量计算 SHA-256：连续到达的数据直接计入，其余部分完成后从磁盘补齐"""
+    def __init__(self):
+        import hashlib
+        self.sha = hashlib.sha256()
+        self.pos = 0
+        self.lock = threading.Lock()
+
+    def update(self, data, offset):
+        with self.lock:
+            if offset == self.pos:
+                self.sha.update(data)
+                self.pos += len(data)
+
+    def finish(self, path):
+        with open(path, 'rb') as f:
+            f.seek(self.pos)
+            for chunk in iter(lambda: f.read(EXTRACT_BUFFER_SIZE), b''):
+                self.sha.update(chunk)
+        return self.sha.hexdigest()
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return {}
+    try:
+        with open(MANIFEST_FILE, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+def update_manifest(path, **fields):
+    """在锁内读-改-写，并行下载的多个线程和进程不会互相覆盖记录"""
+    with file_lock(MANIFEST_FILE):
+        manifest = load_manifest()
+        manifest.setdefault(os.path.abspath(path), {}).update(fields)
+        with atomic_write(MANIFEST_FILE) as f:
+            json.dump(manifest, f, indent=4)
+
+def manifest_entry(path):
+    """返回与磁盘上文件（大小和修改时间）一致的清单记录"""
+    entry = load_manifest().get(os.path.abspath(path))
+    if not entry:
+        return None
+    stat = os.stat(path)
+    if entry.get("size") != stat.st_size or entry.get("mtime") != stat.st_mtime:
+        return None
+    return entry
+
+def hash_file(path):
+    hasher = PrefixHasher()
+    return hasher.finish(path)
+
+def stored_data_offset(archive, info):
+    """未压缩成员的数据在 zip 文件中的偏移"""
+    import struct
+    archive.fp.seek(info.header_offset)
+    header = archive.fp.read(30)
+    name_len, extra_len = struct.unpack('<HH', header[26:30])
+    return info.header_offset + 30 + name_len + extra_len
+
+def extract_member(archive, info, zip_path, dest):
+    """解压单个成员；未压缩成员在支持时用 copy_file_range 在内核中直接复制"""
+    import shutil
+    import zipfile
+    if info.compress_type == zipfile.ZIP_STORED and hasattr(os, 'copy_file_range'):
+        offset = stored_data_offset(archive, info)
+        with open(zip_path, 'rb') as src, open(dest, 'wb') as dst:
+            remaining = info.file_size
+            while remaining:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining, offset)
+                if not copied:
+                    raise OSError(f"short copy while extracting {info.filename}")
+                offset += copied
+                remaining -= copied
+        return
+    with archive.open(info) as src, open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst, EXTRACT_BUFFER_SIZE)
+
+def extract_archive(zip_path):
+    """解压虚拟机镜像成员到以机器名命名的目录"""
+    import zipfile
+    dest_dir = os.path.splitext(zip_path)[0]
+    extracted = []
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        images = [info for info in members if info.filename.lower().endswith(VM_IMAGE_SUFFIXES)]
+        os.makedirs(dest_dir, exist_ok=True)
+        for info in images or members:
+            dest = os.path.join(dest_dir, os.path.basename(info.filename))
+            print(f"[*] Extracting {info.filename}...")
+            extract_member(archive, info, zip_path, dest)
+            extracted.append(os.path.abspath(dest))
+    return extracted
+
+def finish_archive(zip_path, digest=None, verify=False, extract=False):
+    """记录校验和并按需解压，已在清单中校验过的文件不再重复计算"""
+    import zipfile
+    entry = manifest_entry(zip_path) or {}
+    if verify:
+        if entry.get("sha256") and not digest:
+            print(f"[*] {zip_path} already verified (sha256 {entry['sha256']}).")
+        else:
+            digest = digest or hash_file(zip_path)
+            with zipfile.ZipFile(zip_path):
+                pass  # 能读出中央目录即说明文件结构完整
+            stat = os.stat(zip_path)
+            update_manifest(zip_path, sha256=digest, size=stat.st_size, mtime=stat.st_mtime,
+                            verified_at=datetime.now().isoformat())
+            print(f"[✓] {zip_path} sha256 {digest}")
+    if extract:
+        if entry.get("extracted") and all(os.path.exists(p) for p in entry["extracted"]):
+            print(f"[*] {zip_path} already extracted.")
+            return
+        extracted = extract_archive(zip_path)
+        stat = os.stat(zip_path)
+        update_manifest(zip_path, size=stat.st_size, mtime=stat.st_mtime, extracted=extracted)
+        print(f"[✓] Extracted {len(extracted)} file(s) to {os.path.splitext(zip_path)[0]}/")
 
 # ===================== 提交 Flag 模块 =====================
+def classify_flag_response(text):
+    text = text.lower()
+    if "wrong" in text:
+        return "wrong"
+    if "correct" in text:
+        return "correct"
+    return "unknown"
+
 def submit_flag(flag, vm):
+    import requests
     session = get_authenticated_session()
-    url_flag = "https://hackmyvm.eu/machines/checkflag.php"
     data_flag = {"flag": flag, "vm": vm}
     try:
-        response = session.post(url_flag, data_flag, timeout=10)
+        response = session.post(FLAG_URL, data_flag, timeout=HTTP_TIMEOUT)
+        if looks_logged_out(response):
+            response = reauthenticate().post(FLAG_URL, data_flag, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
-        if "wrong" in response.text.lower():
+        result = classify_flag_response(response.text)
+        if result == "wrong":
             print("[!] The flag is incorrect.")
-        elif "correct" in response.text.lower():
+        elif result == "correct":
             print("[+] The flag is CORRECT!")
         else:
             print("[!] Unknown response from server.")
     except requests.RequestException as e:
         print(f"[!] Error submitting flag: {e}")
 
+def read_flag_batch(path):
+    """读取 vm,flag 格式的批量文件（'-' 表示标准输入），跳过空行、注释和表头"""
+    import csv
+    f = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8', newline='')
+    try:
+        entries = []
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].lstrip().startswith('#'):
+                continue
+            if len(row) < 2:
+                print(f"[!] Skipping malformed line: {','.join(row)}")
+                continue
+            vm, flag = row[0].strip(), ','.join(row[1:]).strip()
+            if (vm.lower(), flag.lower()) == ('vm', 'flag'):
+                continue
+            entries.append((vm, flag))
+        return entries
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def check_flag(session, vm, flag, limiter=None):
+    """提交单个 flag，返回结果和请求耗时"""
+    import requests
+    if limiter:
+        limiter.acquire(1)
+    start = time.monotonic()
+    try:
+        response = session.post(FLAG_URL, {"flag": flag, "vm": vm}, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        result = "logged out" if looks_logged_out(response) else classify_flag_response(response.text)
+    except requests.RequestException as e:
+        result = f"error: {e}"
+    return {"vm": vm, "flag": flag, "result": result, "latency_ms": round((time.monotonic() - start) * 1000, 1)}
+
+def color_flag_result(result):
+    if result == "correct":
+        return bcolors.OKGREEN + result + bcolors.ENDC
+    if result == "wrong":
+        return bcolors.FAIL + result + bcolors.ENDC
+    return bcolors.WARNING + result + bcolors.ENDC
+
+def submit_flag_batch(path, jobs=FLAG_JOBS, rate=None, output_format="table", stream=None):
+    """只登录一次，并发提交一批 flag，输出每行的结果和耗时"""
+    from concurrent.futures import ThreadPoolExecutor
+    from prettytable import PrettyTable
+    try:
+        entries = read_flag_batch(path)
+    except OSError as e:
+        print(f"[!] Error reading batch file: {e}")
+        sys.exit(1)
+    if not entries:
+        print("[!] No flags to submit.")
+        sys.exit(1)
+
+    session = get_authenticated_session()
+    jobs = max(min(jobs, len(entries)), 1)
+    if jobs > POOL_SIZE:
+        configure_session(session, pool_size=jobs)
+    limiter = RateLimiter(rate) if rate else None
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(lambda entry: check_flag(session, *entry, limiter=limiter), entries))
+        # session 在批量提交途中失效时只重新登录一次，再补交被拒绝的那些
+        retry = [i for i, result in enumerate(results) if result["result"] == "logged out"]
+        if retry:
+            session = reauthenticate()
+            retried = executor.map(lambda i: check_flag(session, *entries[i], limiter=limiter), retry)
+            for i, result in zip(retry, retried):
+                results[i] = result
+
+    if output_format == "json":
+        print(json.dumps(results, indent=2), file=stream or sys.stdout)
+        return results
+    results_tab = PrettyTable(["VM", "Flag", "Result", "Latency (ms)"])
+    results_tab.align["VM"] = "l"
+    results_tab.align["Flag"] = "l"
+    results_tab.max_width["Result"] = 40
+    for result in results:
+        results_tab.add_row([result["vm"], result["flag"], color_flag_result(result["result"]), result["latency_ms"]])
+    print(results_tab)
+    correct = sum(1 for result in results if result["result"] == "correct")
+    print(f"\n[*] {correct}/{len(results)} flag(s) correct")
+    return results
+
 # ===================== 帮助信息格式化 =====================
 def format_choices(choices, per_line=6):
     """格式化选项列表，每行显示指定数量"""
@@ -438,14 +1989,32 @@ Examples:
   %(prog)s search -l easy                   # List all easy machines
   %(prog)s search -t web                    # List machines tagged 'web'
   %(prog)s search -f medium -p 3            # Filter medium difficulty, page 3
+  %(prog)s search -a -f easy                # Fetch all pages, keep easy machines
+  %(prog)s search -a --format jsonl         # Stream every machine as JSON Lines
+  %(prog)s search --creator sml --refresh   # Re-crawl catalog, list a creator's machines
   %(prog)s writeup Todd                     # Search writeups for 'Todd' machine
+  %(prog)s writeup --author sml --language English
   %(prog)s flag -i "flag{...}" -vm todd     # Submit flag for 'todd'
+  %(prog)s flag --batch flags.csv --rate 5  # Submit 'vm,flag' lines, 5 per second
   %(prog)s download todd                    # Download machine named 'todd'
+  %(prog)s info todd                        # Size, OS, release date and tags of 'todd'
+  %(prog)s info --all --os linux --max-size 2G -t suid
+                                            # Cache every machine's details, then filter
+  %(prog)s download --from-search -l easy -j 3 --limit-rate 20M
+                                            # Download every easy machine
+  %(prog)s --timings search -a              # Show where the time goes
+  %(prog)s shell                            # Run several commands in one warm session
 
 Note: Options -n, -l, and -t cannot be combined with -p.
+      Searches by -n, -l easy/medium/hard, -f, --status and --creator are
+      answered from the local machine catalog (refreshed every 24 hours).
         """
     )
     
+    parser.add_argument("--timings", action="store_true",
+                        help="Print a per-stage timing breakdown (session, cache, http, parse, render) to stderr")
+    parser.add_argument("--profile", metavar="FILE", help="Write cProfile data for the command to FILE")
+
     subparsers = parser.add_subparsers(dest='command', help="Available commands")
 
     # Config command
@@ -474,47 +2043,265 @@ Note: Options -n, -l, and -t cannot be combined with -p.
                              help="Client-side filter by difficulty level")
     parser_search.add_argument("-p", "--page", type=int, default=1,
                              help="Page number for results (default: 1)")
+    parser_search.add_argument("-a", "--all", action="store_true",
+                             help="Fetch every page concurrently and list all machines")
+    parser_search.add_argument("--status", help="Filter by status, e.g. 'to hack' (local catalog)")
+    parser_search.add_argument("--creator", help="Filter by creator (local catalog)")
+    parser_search.add_argument("--refresh", action="store_true",
+                             help="Re-crawl the local machine catalog before searching")
+    parser_search.add_argument("--format", choices=OUTPUT_FORMATS, default="table",
+                             help="Output format; jsonl and csv stream uncolored rows (default: table)")
 
     # Writeup command
     parser_writeup = subparsers.add_parser(
         "writeup",
         help="Search writeups for a specific machine"
     )
-    parser_writeup.add_argument("machine_name", help="Name of the machine to search writeups for")
+    parser_writeup.add_argument("machine_name", nargs="?", help="Name of the machine to search writeups for")
+    parser_writeup.add_argument("--author", help="Only writeups by this author")
+    parser_writeup.add_argument("--language", help="Only writeups in this language, e.g. English")
+    parser_writeup.add_argument("--refresh", action="store_true",
+                                help="Refresh the writeup cache now (exits after refreshing if no query is given)")
+    parser_writeup.add_argument("--format", choices=OUTPUT_FORMATS, default="table",
+                                help="Output format; jsonl and csv stream uncolored rows (default: table)")
+
+    # Info command
+    parser_info = subparsers.add_parser(
+        "info",
+        help="Show machine details (size, OS, release date, tags); filters run on the local cache"
+    )
+    parser_info.add_argument("machine_names", nargs="*", metavar="machine_name",
+                             help="Name(s) of the machine(s) to show")
+    parser_info.add_argument("-a", "--all", action="store_true",
+                             help="Fetch missing or stale details for every machine in the catalog")
+    parser_info.add_argument("-l", "--level", choices=['easy', 'medium', 'hard'], help="Filter by difficulty level")
+    parser_info.add_argument("--os", dest="os_name", help="Filter by operating system, e.g. linux")
+    parser_info.add_argument("-t", "--tag", help="Filter by tag, e.g. suid")
+    parser_info.add_argument("--max-size", type=size_arg, metavar="SIZE", help="Only machines up to SIZE, e.g. 2G")
+    parser_info.add_argument("--refresh", action="store_true",
+                             help=f"Revalidate cached details even if younger than {DETAIL_CACHE_TIMEOUT.days} days")
+    parser_info.add_argument("-j", "--jobs", type=int, default=MAX_WORKERS,
+                             help=f"Concurrent detail page requests (default: {MAX_WORKERS})")
+    parser_info.add_argument("--format", choices=OUTPUT_FORMATS, default="table",
+                             help="Output format; jsonl and csv stream uncolored rows (default: table)")
 
     # Download command
     parser_download = subparsers.add_parser(
         "download",
-        help="Download a machine ZIP file"
+        help="Download one or more machine ZIP files",
+        formatter_class=argparse.RawDescriptionHelpFormatter
     )
-    parser_download.add_argument("machine_name", help="Name of the machine to download")
+    parser_download.add_argument("machine_names", nargs="*", metavar="machine_name",
+                                 help="Name(s) of the machine(s) to download")
+    parser_download.add_argument("--from-search", action="store_true",
+                                 help="Download every machine matching -l/-t/-n")
+    parser_download.add_argument("-l", "--level", choices=LEVEL_CHOICES, help=level_help, metavar="")
+    parser_download.add_argument("-t", "--tag", choices=TAG_CHOICES, help=tag_help, metavar="")
+    parser_download.add_argument("-n", "--name", help="Search by machine name (partial match)")
+    parser_download.add_argument("-s", "--segments", type=int, default=DOWNLOAD_SEGMENTS,
+                                 help=f"Parallel byte ranges per file (default: {DOWNLOAD_SEGMENTS})")
+    parser_download.add_argument("-j", "--jobs", type=int, default=DOWNLOAD_JOBS,
+                                 help=f"Maximum concurrent downloads (default: {DOWNLOAD_JOBS})")
+    parser_download.add_argument("--limit-rate", type=parse_rate, metavar="RATE",
+                                 help="Aggregate bandwidth cap, e.g. 500K, 10M")
+    parser_download.add_argument("--verify", action="store_true",
+                                 help="Hash the zip while downloading and record it in ~/.hmv_manifest.json")
+    parser_download.add_argument("--extract", action="store_true",
+                                 help="Extract the VM image(s) into a directory named after the machine")
+    parser_download.add_argument("--force", action="store_true",
+                                 help="Skip the local did-you-mean check on machine names")
 
     # Flag command
     parser_flag = subparsers.add_parser(
         "flag",
-        help="Submit a flag for a machine"
+        help="Submit a flag for a machine, or a batch of flags"
     )
-    parser_flag.add_argument("-i", "--input", required=True, help="Flag to submit")
-    parser_flag.add_argument("-vm", "--vm", required=True, help="Machine name for flag submission")
+    parser_flag.add_argument("-i", "--input", help="Flag to submit")
+    parser_flag.add_argument("-vm", "--vm", help="Machine name for flag submission")
+    parser_flag.add_argument("--batch", metavar="FILE",
+                             help="Submit 'vm,flag' lines from FILE ('-' reads stdin)")
+    parser_flag.add_argument("-j", "--jobs", type=int, default=FLAG_JOBS,
+                             help=f"Concurrent submissions in batch mode (default: {FLAG_JOBS})")
+    parser_flag.add_argument("--rate", type=float, metavar="N",
+                             help="Maximum submissions per second in batch mode")
+    parser_flag.add_argument("--format", choices=["table", "json"], default="table",
+                             help="Batch result format (default: table)")
+    parser_flag.add_argument("--force", action="store_true",
+                             help="Skip the local did-you-mean check on the -vm name")
 
-    args = parser.parse_args()
+    # Shell command
+    subparsers.add_parser(
+        "shell",
+        help="Interactive shell that keeps the session and local caches loaded between commands"
+    )
 
-    if args.command == "config":
-        configure_credentials()
-        if os.path.exists(SESSION_FILE):
-            os.remove(SESSION_FILE)
-            print("[+] Cleared previous session.")
-    elif args.command == "search":
-        list_machines(level=args.level, search=args.name, tag=args.tag,
-                      filter_level=args.filter_level, page=args.page)
-    elif args.command == "writeup":
-        search_writeups(args.machine_name)
-    elif args.command == "download":
-        download_machine(args.machine_name)
-    elif args.command == "flag":
-        submit_flag(args.input, args.vm)
+    args = parser.parse_args()
+    if args.command == "shell":
+        run_shell(parser, subparsers)
     else:
-        parser.print_help()
+        execute(args, parser, subparsers)
+
+def execute(args, parser, subparsers):
+    """执行一条已解析的命令，按全局选项输出计时和 profile"""
+    global TIMINGS
+    TIMINGS = {} if args.timings else None
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        run_command(args, parser, subparsers)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"[*] Profile written to {args.profile}", file=sys.stderr)
+        if TIMINGS is not None:
+            print_timings(time.perf_counter() - start)
+
+def run_shell(parser, subparsers):
+    """交互式 shell：在同一进程中反复执行命令，复用已登录的 session、连接池和已加载的缓存，
+    重复查询不再付出解释器启动、导入和读取缓存文件的开销"""
+    import shlex
+    try:
+        import readline  # noqa: F401  提供行编辑和历史记录
+    except ImportError:
+        pass
+    print("[*] HackMyVM shell. Type a command such as 'search -n todd' or 'writeup todd'; "
+          "'help' lists commands, 'exit' quits.")
+    while True:
+        try:
+            line = input("hmv> ")
+        except EOFError:
+            print()
+            break
+        except KeyboardInterrupt:
+            print()
+            continue
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            print(f"[!] {e}")
+            continue
+        if not argv:
+            continue
+        if argv[0] in ("exit", "quit"):
+            break
+        if argv[0] == "help":
+            parser.print_help()
+            continue
+        if argv[0] == "shell":
+            print("[!] Already in the shell.")
+            continue
+        # 命令出错时各处会调用 sys.exit()，argparse 也会；在 shell 中只结束当前这条命令
+        try:
+            execute(parser.parse_args(argv), parser, subparsers)
+        except SystemExit:
+            pass
+        except KeyboardInterrupt:
+            print("\n[!] Interrupted.")
+        sys.stdout.flush()
+
+def run_command(args, parser, subparsers):
+    parser_search = subparsers.choices['search']
+    parser_writeup = subparsers.choices['writeup']
+    parser_download = subparsers.choices['download']
+    parser_flag = subparsers.choices['flag']
+    parser_info = subparsers.choices['info']
+
+    # 机器可读的输出模式下 stdout 只保留数据，状态信息改写到 stderr
+    stream = sys.stdout
+    machine_readable = getattr(args, 'format', 'table') != 'table'
+    with contextlib.redirect_stdout(sys.stderr) if machine_readable else contextlib.nullcontext():
+        if args.command == "config":
+            configure_credentials()
+            if os.path.exists(SESSION_FILE) or os.path.exists(LEGACY_SESSION_FILE):
+                for path in (SESSION_FILE, LEGACY_SESSION_FILE):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+                SESSION_CACHE.clear()
+                print("[+] Cleared previous session.")
+        elif args.command == "search":
+            if args.all and args.page != 1:
+                parser_search.error("-a/--all cannot be combined with -p/--page")
+            # 不涉及标签和分页的查询直接由本地目录回答
+            offline = (args.tag is None and args.page == 1 and not args.all
+                       and (args.level is None or args.level in CATALOG_LEVELS))
+            local_filter = args.name or args.level or args.filter_level or args.status or args.creator
+            if offline and (local_filter or args.refresh):
+                level = args.filter_level or (args.level if args.level != 'all' else None)
+                if args.filter_level and args.level not in (None, 'all', args.filter_level):
+                    print("[!] No machines found.")
+                    sys.exit(1)
+                search_catalog(name=args.name, level=level, status=args.status,
+                               creator=args.creator, refresh=args.refresh,
+                               output_format=args.format, stream=stream)
+                return
+            if args.status or args.creator or args.refresh:
+                parser_search.error("--status, --creator and --refresh cannot be combined with -t, -p, -a or this -l")
+            list_machines(level=args.level, search=args.name, tag=args.tag,
+                          filter_level=args.filter_level, page=args.page, all_pages=args.all,
+                          output_format=args.format, stream=stream)
+        elif args.command == "writeup":
+            if not (args.machine_name or args.author or args.language or args.refresh):
+                parser_writeup.error("give a machine name, --author or --language")
+            if args.refresh:
+                if not fetch_and_update_writeups():
+                    sys.exit(1)
+                if not (args.machine_name or args.author or args.language):
+                    return
+            search_writeups(args.machine_name, author=args.author, language=args.language,
+                            output_format=args.format, stream=stream)
+        elif args.command == "info":
+            if args.all and args.machine_names:
+                parser_info.error("--all cannot be combined with machine names")
+            if args.refresh and not (args.all or args.machine_names):
+                parser_info.error("--refresh requires --all or machine names")
+            machine_info(args.machine_names, all_machines=args.all, level=args.level, os_name=args.os_name,
+                         tag=args.tag, max_size=args.max_size, refresh=args.refresh, jobs=args.jobs,
+                         output_format=args.format, stream=stream)
+        elif args.command == "download":
+            names = list(args.machine_names)
+            if args.from_search:
+                names.extend(machines_from_search(level=args.level, search=args.name, tag=args.tag))
+            elif args.level or args.tag or args.name:
+                parser_download.error("-l, -t and -n require --from-search")
+            if not names:
+                parser_download.error("no machines to download")
+            if not args.force and not check_machine_names(args.machine_names):
+                sys.exit(1)
+            seen = set()
+            names = [name for name in names if not (name.lower() in seen or seen.add(name.lower()))]
+            if len(names) == 1:
+                limiter = RateLimiter(args.limit_rate) if args.limit_rate else None
+                download_machine(names[0], segments=args.segments, limiter=limiter,
+                                 verify=args.verify, extract=args.extract)
+            else:
+                download_machines(names, jobs=args.jobs, segments=args.segments, rate=args.limit_rate,
+                                  verify=args.verify, extract=args.extract)
+        elif args.command == "flag":
+            if args.batch:
+                if args.input or args.vm:
+                    parser_flag.error("--batch cannot be combined with -i/-vm")
+                if args.rate is not None and args.rate <= 0:
+                    parser_flag.error("--rate must be positive")
+                submit_flag_batch(args.batch, jobs=args.jobs, rate=args.rate, output_format=args.format,
+                                  stream=stream)
+            elif args.input and args.vm:
+                if not args.force and not check_machine_names([args.vm]):
+                    sys.exit(1)
+                submit_flag(args.input, args.vm)
+            else:
+                parser_flag.error("-i and -vm are required unless --batch is given")
+        else:
+            parser.print_help()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    except BrokenPipeError:
+        # 下游命令（如 head）提前关闭了管道，安静退出
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
\ No newline at end of file